@@ -0,0 +1,164 @@
+import random
+import time
+
+from cross_zero_library import (
+    SIZE, WIN_LINE, EMPTY, PLAYER_X, PLAYER_O,
+    GameV1, GameV2, GameV3, GameV4, winner_from_bits,
+    rule_symmetries, transform_move, position_key, search_key,
+)
+
+# ---------------------------------------------------------
+# Проверки и замеры скорости для крестиков-ноликов.
+# Запуск: python cross_zero_bench.py
+# ---------------------------------------------------------
+
+# Прежние сдвиги на списках - эталон для битовых сдвигов GameV2/GameV3
+def _reference_shift_columns(board, size):
+    for col in range(1, size, 2):
+        bottom = board[size - 1][col]
+        for row in range(size - 1, 0, -1):
+            board[row][col] = board[row - 1][col]
+        board[0][col] = bottom
+
+def _reference_shift_rows(board, size, parity, direction):
+    rows_to_shift = range(1, size, 2) if parity == 0 else range(0, size, 2)
+    for row in rows_to_shift:
+        if direction == 1:
+            board[row] = [board[row][-1]] + board[row][:-1]
+        else:
+            board[row] = board[row][1:] + [board[row][0]]
+
+def _random_positions(game_class, games, seed):
+    # Позиции после каждого хода случайных партий вместе с доской,
+    # которую дают прежние сдвиги на списках
+    rng = random.Random(seed)
+    for _ in range(games):
+        game = game_class(SIZE, WIN_LINE)
+        reference = [[EMPTY] * SIZE for _ in range(SIZE)]
+        while not game.game_over:
+            row, col = rng.choice(game.get_possible_moves(game.current_player))
+            # make_move не сдвигает доску, если партия кончилась самим ходом
+            shifts = not (game.wins_with(row, col, game.current_player)
+                          or game.moves_count + 1 == SIZE * SIZE)
+            shift = (game.shift_parity, game.shift_direction) if game_class is GameV3 else None
+            reference[row][col] = game.current_player
+            game.make_move((row, col))
+            if shifts:
+                if shift is None:
+                    _reference_shift_columns(reference, SIZE)
+                else:
+                    _reference_shift_rows(reference, SIZE, *shift)
+            yield game, reference
+
+def check_winner_equivalence(games=300, seed=0):
+    # Битовые сдвиги должны давать ту же доску, что и прежние сдвиги списков,
+    # а битовая проверка победителя - тот же ответ, что полный обход
+    checked = 0
+    for game_class in (GameV2, GameV3):
+        for game, reference in _random_positions(game_class, games, seed):
+            if game.board != reference:
+                raise AssertionError(f"{game_class.__name__}: доска разошлась с эталонным сдвигом")
+            expected = game._check_winner_on_board()
+            actual = winner_from_bits(game.bits, game.layout)
+            if expected != actual:
+                raise AssertionError(f"{game_class.__name__}: {actual} вместо {expected}")
+            checked += 1
+    return checked
+
+def bench_winner_detection(games=100, seed=1):
+    for game_class in (GameV2, GameV3):
+        positions = [game.copy() for game, _ in _random_positions(game_class, games, seed)]
+        start = time.perf_counter()
+        for game in positions:
+            game._check_winner_on_board()
+        full_scan = time.perf_counter() - start
+        start = time.perf_counter()
+        for game in positions:
+            winner_from_bits(game.bits, game.layout)
+        bit_scan = time.perf_counter() - start
+        print(f"{game_class.__name__}: {len(positions)} позиций, "
+              f"полный обход {full_scan / len(positions) * 1e6:.1f} мкс, "
+              f"битовый {bit_scan / len(positions) * 1e6:.1f} мкс")
+
+# Прежние поворот и гравитация GameV4 - эталон для _rotate_and_settle
+def _reference_rotate(board, size):
+    rotated = [[EMPTY] * size for _ in range(size)]
+    for i in range(size):
+        for j in range(size):
+            rotated[j][size - 1 - i] = board[i][j]
+    return rotated
+
+def _reference_gravity(board, size):
+    new_board = [[EMPTY] * size for _ in range(size)]
+    for col in range(size):
+        pieces = []
+        for row in range(size - 1, -1, -1):
+            if board[row][col] != EMPTY:
+                pieces.append(board[row][col])
+        for row in range(size - 1, -1, -1):
+            if pieces:
+                new_board[row][col] = pieces.pop(0)
+    return new_board
+
+def _random_boards(count, seed):
+    # Произвольные заполнения, а не только достижимые в игре позиции
+    rng = random.Random(seed)
+    for _ in range(count):
+        fill = rng.random()
+        yield [[rng.choice((PLAYER_X, PLAYER_O)) if rng.random() < fill else EMPTY
+                for _ in range(SIZE)] for _ in range(SIZE)]
+
+def check_rotation_equivalence(count=2000, seed=2):
+    game = GameV4(SIZE, WIN_LINE)
+    for board in _random_boards(count, seed):
+        expected = _reference_gravity(_reference_rotate(board, SIZE), SIZE)
+        settled, heights = game._rotate_and_settle(board)
+        if settled != expected:
+            raise AssertionError("GameV4: поворот с падением разошёлся с эталоном")
+        if heights != [sum(1 for row in settled if row[c] != EMPTY) for c in range(SIZE)]:
+            raise AssertionError("GameV4: неверные высоты столбцов")
+        if game._apply_gravity_to_board(board)[0] != _reference_gravity(board, SIZE):
+            raise AssertionError("GameV4: гравитация разошлась с эталоном")
+    return count
+
+def bench_rotation(count=2000, seed=3):
+    boards = list(_random_boards(count, seed))
+    game = GameV4(SIZE, WIN_LINE)
+    start = time.perf_counter()
+    for board in boards:
+        _reference_gravity(_reference_rotate(board, SIZE), SIZE)
+    reference = time.perf_counter() - start
+    start = time.perf_counter()
+    for board in boards:
+        game._rotate_and_settle(board)
+    fused = time.perf_counter() - start
+    print(f"GameV4: поворот с падением - прежний {reference / count * 1e6:.1f} мкс, "
+          f"новый {fused / count * 1e6:.1f} мкс")
+
+def check_symmetry_equivalence(games=300, seed=4):
+    # Партия GameV1, сыгранная отражёнными ходами, должна давать отражённые
+    # позиции с тем же исходом (у GameV5 превращения случайны, остальные
+    # варианты симметрий не допускают)
+    rng = random.Random(seed)
+    checked = 0
+    for symmetry in rule_symmetries(GameV1(SIZE, WIN_LINE)):
+        for _ in range(games):
+            game = GameV1(SIZE, WIN_LINE)
+            mirror = GameV1(SIZE, WIN_LINE)
+            while not game.game_over:
+                move = rng.choice(game.get_possible_moves(game.current_player))
+                game.make_move(move)
+                mirror.make_move(transform_move(game, symmetry, move))
+                if (position_key(game, symmetry) != position_key(mirror)
+                        or search_key(game)[0] != search_key(mirror)[0]
+                        or (game.game_over, game.winner) != (mirror.game_over, mirror.winner)):
+                    raise AssertionError(f"GameV1: симметрия {symmetry} меняет игру")
+                checked += 1
+    return checked
+
+if __name__ == "__main__":
+    print(f"Проверено позиций: {check_winner_equivalence()}")
+    bench_winner_detection()
+    print(f"Проверено досок V4: {check_rotation_equivalence()}")
+    bench_rotation()
+    print(f"Проверено симметричных позиций: {check_symmetry_equivalence()}")
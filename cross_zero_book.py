@@ -0,0 +1,93 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from cross_zero_library import (
+    SIZE, WIN_LINE, GAME_VERSIONS, BOOK_DIR, Bot, MCTSBot,
+    OpeningBook, canonical_key, book_entry, book_path,
+)
+
+# ---------------------------------------------------------
+# Построение дебютных книг: первые позиции каждого варианта
+# просчитываются глубже, чем в игре, параллельно в процессах, и
+# лучшие ходы сохраняются в books/cross_zero_v<N>.bin.
+# Запуск: python cross_zero_book.py --variants 1 4 --plies 3
+# ---------------------------------------------------------
+
+# Глубина и время на позицию при построении: больше, чем в игровом окне
+BOOK_DEPTH = {1: 6, 2: 4, 3: 4, 4: 6}
+BOOK_TIME_LIMIT = 20.0
+
+def search_position(version, game, depth, time_limit):
+    # Лучший ход в позиции; выполняется в процессе пула
+    if version == 5:
+        bot = MCTSBot(game, player=game.current_player, time_limit=time_limit, seed=0)
+    else:
+        bot = Bot(game, max_depth=depth, player=game.current_player, time_limit=time_limit)
+    return bot.get_best_move(game)
+
+def expand(game, move, width, first):
+    # Продолжения позиции: ход из книги и ещё width лучших по порядку
+    # ходов бота; из начальной позиции - все ходы
+    if first:
+        moves = game.get_possible_moves(game.current_player)
+    else:
+        moves = Bot(game, player=game.current_player)._ordered_moves(game, game.current_player, 0)
+        moves = [m for m in moves if m != move][:width]
+        if move is not None:
+            moves.insert(0, move)
+    children = []
+    for m in moves:
+        child = game.copy()
+        child.make_move(m)
+        if not child.game_over:
+            children.append(child)
+    return children
+
+def build_book(version, plies, width, depth, time_limit, workers):
+    game_class = GAME_VERSIONS[version]
+    frontier = [game_class(SIZE, WIN_LINE)]
+    entries = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for ply in range(plies):
+            # одинаковые и симметричные позиции, пришедшие разными путями,
+            # считаются один раз
+            unique = {}
+            for game in frontier:
+                unique.setdefault(canonical_key(game)[0], game)
+            games = [game for key, game in unique.items() if key not in entries]
+            start = time.perf_counter()
+            moves = list(pool.map(search_position, [version] * len(games), games,
+                                  [depth] * len(games), [time_limit] * len(games)))
+            frontier = []
+            for game, move in zip(games, moves):
+                if move is not None:
+                    key, code = book_entry(game, move)
+                    entries[key] = code
+                frontier.extend(expand(game, move, width, ply == 0))
+            print(f"V{version}, ход {ply + 1}: позиций {len(games)}, "
+                  f"{time.perf_counter() - start:.1f} с")
+    return OpeningBook(entries.items())
+
+def main():
+    parser = argparse.ArgumentParser(description="Построение дебютных книг крестиков-ноликов")
+    parser.add_argument("--variants", nargs="+", type=int, default=list(GAME_VERSIONS), choices=list(GAME_VERSIONS))
+    parser.add_argument("--plies", type=int, default=3, help="сколько первых ходов партии просчитать")
+    parser.add_argument("--width", type=int, default=3, help="продолжений на позицию после первого хода")
+    parser.add_argument("--depth", type=int, help="глубина поиска (по умолчанию BOOK_DEPTH)")
+    parser.add_argument("--time", type=float, default=BOOK_TIME_LIMIT, help="секунд на позицию")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    os.makedirs(BOOK_DIR, exist_ok=True)
+    for version in args.variants:
+        depth = args.depth or BOOK_DEPTH.get(version, 1)
+        book = build_book(version, args.plies, args.width, depth, args.time, args.workers)
+        book.save(book_path(version))
+        print(f"V{version}: записано позиций {len(book)} в {book_path(version)}")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,25 @@
 import pygame
 import sys
 import random
+import math
 import copy
 import os
+import threading
+import time
+import multiprocessing
+import hashlib
+import struct
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait
 
 # ==================== ОБЩИЕ НАСТРОЙКИ ====================
-SIZE = 10
+SIZE = 10                 # размер доски по умолчанию; окно и боты берут его из аргументов
 WIN_LINE = SIZE // 2
-CELL_SIZE = 50
+BOARD_PIXELS = 500        # сторона поля в пикселях; клетка - BOARD_PIXELS // размер доски
+MIN_CELL_SIZE = 20
 INFO_PANEL_HEIGHT = 60
-WINDOW_WIDTH = SIZE * CELL_SIZE
-WINDOW_HEIGHT = SIZE * CELL_SIZE + INFO_PANEL_HEIGHT
 
 # Цвета
 WHITE = (255, 255, 255)
@@ -32,21 +41,43 @@ V4_ROTATION_FALL_DURATION = 600
 V4_PRE_FALL_DELAY = 1000
 # =========================================================
 
+# ================== НАСТРОЙКИ БОТА ======================
+CANDIDATE_RADIUS = 2      # ходы-кандидаты - клетки не дальше этого расстояния от фишек
+KILLER_SLOTS = 2          # сколько "killer"-ходов хранится на каждом уровне поиска
+WIN_SCORE = 10 ** 9       # оценка выигрыша при длине линии до 5 (дальше растёт, см. win_score)
+BOT_TIME_LIMIT = 2.0      # секунд на обдумывание хода в игровом окне
+BOT_WORKERS = 1           # процессов для поиска в корне; больше 1 - пул процессов spawn
+PONDER_REPLIES = 3        # на сколько вероятных ходов человека бот готовит ответ во время его хода
+MCTS_EXPLORATION = 1.4    # коэффициент исследования в UCB1
+MCTS_ROLLOUT_BATCH = 8    # случайных партий из каждого нового листа дерева
+MCTS_ROLLOUT_TRIES = 4    # попыток выбрать в доигрывании клетку рядом с фишками
+MCTS_MAX_CHILDREN = 12    # сколько лучших по эвристике ходов раскрывается в узле
+THREAT_NODE_LIMIT = 3000  # ходов, которые может сделать поиск по угрозам за один вызов
+THREAT_DEPTH = 6          # сколько подряд "четвёрок" атакующего рассматривает поиск по угрозам
+TT_MAX_ENTRIES = 200000   # размер таблицы транспозиций бота, после него она очищается
+BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "books")
+# =========================================================
+
+def cell_size_for(size):
+    # Размер клетки для доски size x size: поле остаётся около BOARD_PIXELS,
+    # но клетка не меньше MIN_CELL_SIZE
+    return max(MIN_CELL_SIZE, BOARD_PIXELS // size)
+
 # ---------------------------------------------------------
 # Функция загрузки изображений (с масштабированием)
 # ---------------------------------------------------------
-def load_images():
+def load_images(cell_size):
     img_x = None
     img_o = None
     try:
         if os.path.exists("krestik.png"):
             img_x = pygame.image.load("krestik.png")
-            img_x = pygame.transform.scale(img_x, (CELL_SIZE, CELL_SIZE))
+            img_x = pygame.transform.scale(img_x, (cell_size, cell_size))
         else:
             print("Предупреждение: файл krestik.png не найден, будет использоваться рисование")
         if os.path.exists("zero.png"):
             img_o = pygame.image.load("zero.png")
-            img_o = pygame.transform.scale(img_o, (CELL_SIZE, CELL_SIZE))
+            img_o = pygame.transform.scale(img_o, (cell_size, cell_size))
         else:
             print("Предупреждение: файл zero.png не найден, будет использоваться рисование")
     except pygame.error as e:
@@ -56,50 +87,344 @@ def load_images():
 # ---------------------------------------------------------
 # Базовый класс для бота (минимакс с альфа-бета отсечением)
 # ---------------------------------------------------------
+class SearchAborted(Exception):
+    pass
+
+# Рабочие процессы параллельного поиска получают общий флаг остановки
+# при старте пула и держат по боту на каждого игрока (killer/history
+# накапливаются между итерациями, таблица транспозиций очищается перед
+# каждой задачей)
+_worker_abort_event = None
+_worker_bots = {}
+
+def _init_search_worker(abort_event):
+    global _worker_abort_event
+    _worker_abort_event = abort_event
+
+def _score_root_moves(player, game, moves, depth, time_left):
+    bot = _worker_bots.get(player)
+    if bot is None:
+        bot = Bot(None, player=player)
+        _worker_bots[player] = bot
+    bot._stop_event = _worker_abort_event
+    bot._deadline = time.perf_counter() + time_left if time_left is not None else None
+    # Задача может попасть в любой процесс пула, а записи прошлых задач
+    # (в том числе более глубокие) меняли бы оценки - ответ зависел бы от
+    # того, какому процессу что досталось
+    bot.table.clear()
+    try:
+        return bot._search_root(game, moves, depth)
+    except SearchAborted:
+        return None
+
+def win_score(win_line):
+    # Выигрыш должен стоить больше любой оценки _evaluate: линия из
+    # win_line - 1 фишек весит 10 ** (win_line - 2), а окон на доске
+    # меньше 4 * size ** 2 - запаса WIN_SCORE хватает до доски 500x500
+    return WIN_SCORE * 10 ** max(0, win_line - 5)
+
 class Bot:
-    def __init__(self, game, max_depth=1):
+    def __init__(self, game, max_depth=1, player=PLAYER_O, time_limit=None, workers=1, book=None,
+                 threat_nodes=THREAT_NODE_LIMIT):
         self.game = game
         self.max_depth = max_depth
-
-    def get_best_move(self):
-        moves = self.game.get_possible_moves(PLAYER_O)
+        self.player = player
+        self.time_limit = time_limit
+        self.workers = workers
+        self.book = book
+        self.threat_nodes = threat_nodes
+        self.killers = {}
+        self.history = {}
+        self.table = {}           # таблица транспозиций: ключ search_key -> (глубина, оценка, граница, ход)
+        self._table_rules = None  # вариант, размер и длина линии, для которых заполнена таблица
+        self._win_score = WIN_SCORE
+        self.nodes = 0            # счётчик узлов поиска (для замеров скорости)
+        self._stop_event = None
+        self._deadline = None
+        self._pool = None
+        self._pool_abort = None
+        self._stragglers = set()  # задачи прерванного поиска, которые ещё не вернулись
+
+    def get_best_move(self, game=None, stop_event=None):
+        # Итеративное углубление: при остановке по времени или по stop_event
+        # возвращается лучший ход последней завершённой глубины
+        if game is None:
+            game = self.game
+        if self.book is not None:
+            move = self.book.lookup(game)
+            if move is not None:
+                return move
+        self.start_pool()         # запуск процессов не в счёт времени на ход
+        self._stop_event = stop_event
+        self._deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        moves = self._ordered_moves(game, self.player, 0)
         if not moves:
             return None
+        if self.threat_nodes:
+            forced = self._threat_moves(game, moves)
+            if len(forced) == 1:
+                return forced[0]
+            moves = forced
+
+        best_move = moves[0]
+        for depth in range(1, self.max_depth + 1):
+            try:
+                if self.workers > 1 and len(moves) > 1:
+                    _, best_move = self._search_root_parallel(game, moves, depth)
+                else:
+                    _, best_move = self._search_root(game, moves, depth)
+            except SearchAborted:
+                break
+            moves.remove(best_move)
+            moves.insert(0, best_move)
+        return best_move
 
-        # Для глубины 1 просто оцениваем каждый ход и выбираем лучший
+    def _search_root(self, game, moves, depth):
+        # Ключи таблицы не содержат правил партии: при смене варианта,
+        # размера или длины линии старые записи не годятся
+        rules = (type(game), game.size, game.win_line, getattr(game, 'deterministic', None))
+        if rules != self._table_rules:
+            self.table.clear()
+            self._table_rules = rules
+            self._win_score = win_score(game.win_line)
         best_score = -float('inf')
         best_move = None
+        alpha = -float('inf')
         for move in moves:
-            game_copy = self.game.copy()
+            game_copy = game.copy()
             game_copy.make_move(move)
-            score = self._evaluate(game_copy, PLAYER_O)
+            score = self._search(game_copy, depth - 1, alpha, float('inf'), 1)
             if score > best_score:
                 best_score = score
                 best_move = move
-        return best_move
+            alpha = max(alpha, score)
+        return best_score, best_move
+
+    def _search_root_parallel(self, game, moves, depth):
+        # Ходы корня раздаются процессам через один (moves[i::workers]).
+        # Итог не зависит от того, какой процесс закончил первым: берётся
+        # наибольшая оценка, при равенстве - ход, стоящий раньше в moves.
+        # С последовательным поиском ход может разойтись: тот хранит свою
+        # таблицу транспозиций между ходами партии, а процессы начинают
+        # каждую задачу с пустой
+        pool = self._get_pool()
+        # Задачи прерванного поиска получили сигнал остановки и бросают
+        # поиск на ближайшем узле; флаг снимается только после них, иначе
+        # они доработали бы до своего срока, занимая процессы пула
+        if self._stragglers:
+            wait(self._stragglers)
+            self._stragglers = set()
+        self._pool_abort.clear()
+        time_left = None
+        if self._deadline is not None:
+            time_left = max(0.0, self._deadline - time.perf_counter())
+        chunks = [moves[i::self.workers] for i in range(self.workers)]
+        futures = [pool.submit(_score_root_moves, self.player, game, chunk, depth, time_left)
+                   for chunk in chunks if chunk]
+        try:
+            pending = set(futures)
+            while pending:
+                self._check_abort()
+                _, pending = wait(pending, timeout=0.05)
+        except SearchAborted:
+            self._pool_abort.set()
+            for future in futures:
+                future.cancel()
+            self._stragglers = {future for future in futures if not future.done()}
+            raise
+
+        best_score = -float('inf')
+        best_index = len(moves)
+        for future in futures:
+            result = future.result()
+            if result is None:
+                raise SearchAborted()
+            score, move = result
+            index = moves.index(move)
+            if score > best_score or (score == best_score and index < best_index):
+                best_score = score
+                best_index = index
+        return best_score, moves[best_index]
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn, а не fork: поиск идёт из потока BotThinker в процессе с
+            # окном pygame, а fork копирует только вызывающий поток
+            context = multiprocessing.get_context("spawn")
+            self._pool_abort = context.Event()
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                             initializer=_init_search_worker,
+                                             initargs=(self._pool_abort,))
+            # процессы spawn стартуют долго - дождаться их до начала поиска
+            wait([self._pool.submit(os.getpid) for _ in range(self.workers)])
+        return self._pool
+
+    def clone(self):
+        # Бот с теми же настройками, но своими таблицами, флагами остановки
+        # и без пула процессов - для обдумывания ответов заранее в BotThinker
+        return Bot(self.game, max_depth=self.max_depth, player=self.player, time_limit=self.time_limit,
+                   book=self.book, threat_nodes=self.threat_nodes)
+
+    def start_pool(self):
+        # Запуск процессов заранее (BotThinker делает это в фоне), чтобы
+        # их старт не приходился на первый ход бота
+        if self.workers > 1:
+            self._get_pool()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool_abort.set()
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+            self._stragglers = set()
+
+    def _check_abort(self):
+        if self._stop_event is not None and self._stop_event.is_set():
+            raise SearchAborted()
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SearchAborted()
+
+    def _search(self, game, depth, alpha, beta, ply):
+        self._check_abort()
+        self.nodes += 1
+        if game.game_over:
+            if game.winner is None:
+                return 0
+            if game.winner == self.player:
+                return self._win_score + depth
+            return -self._win_score - depth
+        if depth <= 0:
+            return self._evaluate(game, self.player)
+
+        # Симметричные позиции имеют один ключ; лучший ход хранится в
+        # каноническом виде и переводится обратно для этой позиции
+        key, symmetry = search_key(game)
+        alpha_orig, beta_orig = alpha, beta
+        table_move = None
+        entry = self.table.get(key)
+        if entry is not None:
+            entry_depth, score, bound, table_move = entry
+            if entry_depth >= depth:
+                if bound == TT_EXACT:
+                    return score
+                if bound == TT_LOWER:
+                    alpha = max(alpha, score)
+                else:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    return score
+            table_move = untransform_move(game, symmetry, table_move)
+
+        player = game.current_player
+        maximizing = player == self.player
+        moves = self._ordered_moves(game, player, ply)
+        if not moves:
+            return self._evaluate(game, self.player)
+        if table_move in moves:
+            moves.remove(table_move)
+            moves.insert(0, table_move)
+
+        best = -float('inf') if maximizing else float('inf')
+        best_move = moves[0]
+        for move in moves:
+            game_copy = game.copy()
+            game_copy.make_move(move)
+            score = self._search(game_copy, depth - 1, alpha, beta, ply + 1)
+            if maximizing:
+                if score > best:
+                    best, best_move = score, move
+                alpha = max(alpha, best)
+            else:
+                if score < best:
+                    best, best_move = score, move
+                beta = min(beta, best)
+            if alpha >= beta:
+                self._remember_cutoff(move, depth, ply)
+                break
+
+        if best <= alpha_orig:
+            bound = TT_UPPER
+        elif best >= beta_orig:
+            bound = TT_LOWER
+        else:
+            bound = TT_EXACT
+        if len(self.table) >= TT_MAX_ENTRIES:
+            self.table.clear()
+        self.table[key] = (depth, best, bound, transform_move(game, symmetry, best_move))
+        return best
+
+    def _ordered_moves(self, game, player, ply):
+        # Сначала вынужденные ходы (выигрыш/блок), затем killer-ходы этого уровня,
+        # затем остальные по убыванию history-счёта
+        get_candidates = getattr(game, 'get_candidate_moves', None)
+        if get_candidates is not None:
+            forced, quiet = get_candidates(player)
+        else:
+            forced, quiet = [], game.get_possible_moves(player)
+        killers = self.killers.get(ply, ())
+        history = self.history
+        quiet.sort(key=lambda m: (m not in killers, -history.get(m, 0)))
+        return forced + quiet
+
+    def _threat_moves(self, game, moves):
+        # Поиск по угрозам до основного поиска: форсированный выигрыш
+        # возвращается единственным ходом; если форсированный выигрыш есть
+        # у соперника, остаются только ходы, после которых он пропадает.
+        # Все проверки делят один лимит узлов: ход, который не успели
+        # проверить, остаётся в списке. Остановка по stop_event или сроку
+        # прерывает проверки - тогда ходы не фильтруются
+        opponent = PLAYER_X if self.player == PLAYER_O else PLAYER_O
+        search = ThreatSearch(self.threat_nodes, check_abort=self._check_abort)
+        try:
+            move = search.find_win(game, self.player)
+            if move is not None:
+                return [move]
+            passed = game.copy()
+            passed.current_player = opponent
+            if search.find_win(passed, opponent) is None:
+                return moves
+            defences = []
+            for move in moves:
+                child = game.copy()
+                child.make_move(move)
+                if child.game_over or search.find_win(child, opponent) is None:
+                    defences.append(move)
+        except SearchAborted:
+            return moves
+        return defences or moves
+
+    def _remember_cutoff(self, move, depth, ply):
+        killers = self.killers.setdefault(ply, [])
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[KILLER_SLOTS:]
+        self.history[move] = self.history.get(move, 0) + depth * depth
 
     def _evaluate(self, game, player):
         opponent = PLAYER_X if player == PLAYER_O else PLAYER_O
         size = game.size
         win_line = game.win_line
-        weight = {1: 1, 2: 10, 3: 100, 4: 1000, 5: 10000}
+        # линия из count своих фишек весит в 10 раз больше линии из count - 1,
+        # для любой длины выигрышной линии
+        weight = {count: 10 ** (count - 1) for count in range(1, win_line + 1)}
+        board = game.board
         score = 0
 
         for r in range(size):
             for c in range(size - win_line + 1):
-                line = [game.board[r][c + i] for i in range(win_line)]
+                line = [board[r][c + i] for i in range(win_line)]
                 score += self._line_score(line, player, opponent, weight)
         for c in range(size):
             for r in range(size - win_line + 1):
-                line = [game.board[r + i][c] for i in range(win_line)]
+                line = [board[r + i][c] for i in range(win_line)]
                 score += self._line_score(line, player, opponent, weight)
         for r in range(size - win_line + 1):
             for c in range(size - win_line + 1):
-                line = [game.board[r + i][c + i] for i in range(win_line)]
+                line = [board[r + i][c + i] for i in range(win_line)]
                 score += self._line_score(line, player, opponent, weight)
         for r in range(size - win_line + 1):
             for c in range(win_line - 1, size):
-                line = [game.board[r + i][c - i] for i in range(win_line)]
+                line = [board[r + i][c - i] for i in range(win_line)]
                 score += self._line_score(line, player, opponent, weight)
 
         return score
@@ -114,6 +439,442 @@ class Bot:
         else:
             return 0
 
+# ---------------------------------------------------------
+# Фоновое обдумывание хода: игровой цикл продолжает рисовать и
+# обрабатывать события, пока бот ищет ход в отдельном потоке
+# ---------------------------------------------------------
+class BotThinker:
+    def __init__(self, bot, ponder_replies=PONDER_REPLIES):
+        self.bot = bot
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        start_pool = getattr(bot, 'start_pool', None)
+        if start_pool is not None:
+            self.executor.submit(start_pool)   # пул процессов поиска стартует, пока ходит человек
+        self.future = None
+        self.stop_event = None
+        # Заготовки ищет отдельный бот: у основного свои stop_event, срок и
+        # флаг остановки пула, и прерванная заготовка не должна их задеть.
+        # Бот без clone (MCTSBot) заранее не думает
+        clone = getattr(bot, 'clone', None)
+        self.ponder_bot = clone() if ponder_replies and clone is not None else None
+        self.ponder_replies = ponder_replies if self.ponder_bot is not None else 0
+        self.pondering = {}       # ключ позиции после хода человека -> (future, stop_event)
+        self.ponder_key = None    # позиция, для которой запущено обдумывание
+
+    def start(self, game):
+        # Если ответ на эту позицию уже ищется или найден заранее, поиск
+        # продолжается, остальные заготовки отменяются
+        self.cancel_search()
+        hit = self.pondering.pop(position_key(game), None)
+        self.stop_pondering()
+        if hit is not None and not hit[0].cancelled():
+            self.future, self.stop_event = hit
+            return
+        self.stop_event = threading.Event()
+        self.future = self.executor.submit(self.bot.get_best_move, game.copy(), self.stop_event)
+
+    def ponder(self, game):
+        # Во время хода человека бот заранее ищет ответы на его вероятные
+        # ходы. Задачи идут по очереди в том же потоке, что и обычный
+        # поиск, и отменяются, как только он нужен
+        if self.future is not None or game.game_over or not self.ponder_replies:
+            return
+        key = position_key(game)
+        if key == self.ponder_key:
+            return
+        self.stop_pondering()
+        self.ponder_key = key
+        for reply in predict_replies(game, self.ponder_replies):
+            child = game.copy()
+            child.make_move(reply)
+            if child.game_over or child.current_player != self.bot.player:
+                continue
+            stop_event = threading.Event()
+            future = self.executor.submit(self.ponder_bot.get_best_move, child, stop_event)
+            self.pondering[position_key(child)] = (future, stop_event)
+
+    def stop_pondering(self):
+        for future, stop_event in self.pondering.values():
+            stop_event.set()
+            future.cancel()
+        self.pondering = {}
+        self.ponder_key = None
+
+    def is_thinking(self):
+        return self.future is not None
+
+    def poll(self):
+        # (True, ход), когда поиск завершён, иначе (False, None)
+        if self.future is None or not self.future.done():
+            return False, None
+        future = self.future
+        self.future = None
+        return True, future.result()
+
+    def cancel_search(self):
+        if self.future is not None:
+            self.stop_event.set()
+            self.future.cancel()
+            self.future = None
+
+    def cancel(self):
+        self.cancel_search()
+        self.stop_pondering()
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+        self.bot.close()
+
+# ---------------------------------------------------------
+# Ходы-кандидаты для вариантов с выбором клетки (V2, V3, V5)
+# ---------------------------------------------------------
+# Кандидаты - пустые клетки не дальше CANDIDATE_RADIUS от фишек. V5 ведёт
+# таблицу near[r][c] (сколько фишек рядом), обновляя её при постановке;
+# V2 и V3 получают ту же область расширением битовой маски занятых клеток.
+def _empty_near(size):
+    return [[0] * size for _ in range(size)]
+
+def _mark_near(near, size, row, col, delta):
+    for r in range(max(0, row - CANDIDATE_RADIUS), min(size, row + CANDIDATE_RADIUS + 1)):
+        near_row = near[r]
+        for c in range(max(0, col - CANDIDATE_RADIUS), min(size, col + CANDIDATE_RADIUS + 1)):
+            near_row[c] += delta
+
+def _cell_potential(game, row, col, player):
+    # Эвристика клетки: окна длины win_line через (row, col), которые ход
+    # продолжает (только свои фишки) или перекрывает (только чужие)
+    size = game.size
+    win_line = game.win_line
+    board = game.board
+    score = 0
+    for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+        for shift in range(win_line):
+            r0 = row - dr * shift
+            c0 = col - dc * shift
+            r1 = r0 + dr * (win_line - 1)
+            c1 = c0 + dc * (win_line - 1)
+            if not (0 <= r0 < size and 0 <= c0 < size and 0 <= r1 < size and 0 <= c1 < size):
+                continue
+            own = other = 0
+            for k in range(win_line):
+                value = board[r0 + dr * k][c0 + dc * k]
+                if value == player:
+                    own += 1
+                elif value != EMPTY:
+                    other += 1
+            if other == 0:
+                score += 4 ** own
+            elif own == 0:
+                score += 3 ** other
+    return score
+
+def candidate_moves(game, player):
+    # Возвращает (вынужденные, остальные): если есть выигрывающий ход - только он(и),
+    # иначе вынужденные - блоки выигрыша соперника, остальные - клетки рядом с фишками.
+    # Победа проверяется до сдвига/превращения, а блоки - нет: если после
+    # нашего хода доска меняется (сдвиг V2/V3, превращение V5 каждый
+    # третий ход), угрозы соперника переезжают, и блоков не ищем
+    cells = game.candidate_cells()
+    if not cells:
+        center = game.size // 2
+        if game.board[center][center] == EMPTY:
+            return [], [(center, center)]
+        return [], game.get_possible_moves(player)
+
+    wins = [(r, c) for r, c in cells if game.wins_with(r, c, player)]
+    if wins:
+        return wins, []
+    if _transforms_after_move(game):
+        return [], cells
+    opponent = PLAYER_X if player == PLAYER_O else PLAYER_O
+    blocks = [(r, c) for r, c in cells if game.wins_with(r, c, opponent)]
+    if blocks:
+        quiet = [cell for cell in cells if cell not in blocks]
+        return blocks, quiet
+    return [], cells
+
+def predict_replies(game, count):
+    # Вероятные ходы того, кто ходит в game: вынужденные, затем лучшие по
+    # _cell_potential (у вариантов с падением - клетка, куда упадёт фишка)
+    player = game.current_player
+    get_candidates = getattr(game, 'get_candidate_moves', None)
+    if get_candidates is not None:
+        forced, quiet = get_candidates(player)
+        quiet.sort(key=lambda cell: -_cell_potential(game, cell[0], cell[1], player))
+        return (forced + quiet)[:count]
+    columns = game.get_possible_moves(player)
+    columns.sort(key=lambda col: -_cell_potential(game, game.size - 1 - game.heights[col], col, player))
+    return columns[:count]
+
+# ---------------------------------------------------------
+# Поиск по угрозам (VCF - победа непрерывными "четвёрками")
+# ---------------------------------------------------------
+# Атакующий делает только ходы, после которых ему остаётся один ход до
+# победы, защитник - только блоки этих ходов. Ходы делаются настоящими
+# copy()/make_move, поэтому падение, сдвиги и повороты учитываются
+# точно. Если после ответа защитника доска меняется (сдвиг V2/V3,
+# поворот V4 и превращение V5 каждый третий ход), перебираются все его
+# ответы. Кандидатов даёт индекс окон - всех отрезков длины win_line.
+_LINE_WINDOWS = {}
+
+def line_windows(size, win_line):
+    # Окна как пары (клетки, itemgetter значений окна из доски,
+    # развёрнутой в один список по строкам)
+    key = (size, win_line)
+    windows = _LINE_WINDOWS.get(key)
+    if windows is None:
+        windows = []
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for r in range(size):
+                for c in range(size):
+                    r1 = r + dr * (win_line - 1)
+                    c1 = c + dc * (win_line - 1)
+                    if 0 <= r1 < size and 0 <= c1 < size:
+                        cells = tuple((r + dr * k, c + dc * k) for k in range(win_line))
+                        windows.append((cells, itemgetter(*(row * size + col for row, col in cells))))
+        _LINE_WINDOWS[key] = windows
+    return windows
+
+def _window_cells(game):
+    # Один проход по окнам для обоих игроков: (игрок, own) -> пустые клетки
+    # окон, где ровно own фишек игрока и нет чужих, по убыванию числа
+    # таких окон через клетку; own - win_line - 1 (ход до победы) и
+    # win_line - 2 (ход до "четвёрки")
+    flat = [value for row in game.board for value in row]
+    win_line = game.win_line
+    low = win_line - 2
+    counts = {(player, own): {} for player in (PLAYER_X, PLAYER_O) for own in (win_line - 1, low)}
+    for window, get_values in line_windows(game.size, win_line):
+        values = get_values(flat)
+        stones_x = values.count(PLAYER_X)
+        stones_o = values.count(PLAYER_O)
+        if stones_x + stones_o < low or (stones_x and stones_o):
+            continue
+        for player, stones, other in ((PLAYER_X, stones_x, stones_o), (PLAYER_O, stones_o, stones_x)):
+            cells = counts.get((player, stones))
+            if cells is not None and not other:
+                for cell, value in zip(window, values):
+                    if value == EMPTY:
+                        cells[cell] = cells.get(cell, 0) + 1
+    return {key: sorted(cells, key=lambda cell: -cells[cell]) for key, cells in counts.items()}
+
+def _move_to_cell(game, row, col):
+    # Ход, ставящий фишку в (row, col), или None, если сейчас туда не сходить
+    if isinstance(game, (GameV1, GameV4)):
+        return col if game.heights[col] == game.size - 1 - row else None
+    return (row, col) if game.board[row][col] == EMPTY else None
+
+def _transforms_after_move(game):
+    if isinstance(game, (GameV2, GameV3)):
+        return True
+    if isinstance(game, (GameV4, GameV5)):
+        return (game.moves_count + 1) % 3 == 0
+    return False
+
+class ThreatSearch:
+    def __init__(self, node_limit=THREAT_NODE_LIMIT, max_depth=THREAT_DEPTH, check_abort=None):
+        self.node_limit = node_limit
+        self.max_depth = max_depth
+        self.check_abort = check_abort   # вызывается на каждом узле; может бросить SearchAborted
+        self.nodes = 0
+
+    def find_win(self, game, attacker):
+        # Первый ход форсированного выигрыша attacker (он ходит в game) или None
+        if game.game_over or (isinstance(game, GameV5) and not game.deterministic):
+            return None
+        return self._attack(game, attacker, self.max_depth)
+
+    def _play(self, game, player, move):
+        if self.check_abort is not None:
+            self.check_abort()
+        self.nodes += 1
+        child = game.copy()
+        child.current_player = player
+        child.make_move(move)
+        return child
+
+    def _winning_moves(self, game, player, cells):
+        # cells - результат _window_cells(game)
+        moves = []
+        for r, c in cells[player, game.win_line - 1]:
+            move = _move_to_cell(game, r, c)
+            if move is not None and move not in moves and self.nodes < self.node_limit:
+                if self._play(game, player, move).winner == player:
+                    moves.append(move)
+        return moves
+
+    def _attack(self, game, attacker, depth):
+        cells = _window_cells(game)
+        wins = self._winning_moves(game, attacker, cells)
+        if wins:
+            return wins[0]
+        if depth == 0:
+            return None
+        tried = []
+        for r, c in cells[attacker, game.win_line - 2]:
+            if self.nodes >= self.node_limit:
+                return None
+            move = _move_to_cell(game, r, c)
+            if move is None or move in tried:
+                continue
+            tried.append(move)
+            child = self._play(game, attacker, move)
+            if child.game_over:
+                if child.winner == attacker:
+                    return move
+                continue
+            if self._defend(child, attacker, depth - 1):
+                return move
+        return None
+
+    def _defend(self, game, attacker, depth):
+        # True, если attacker выигрывает при любом ответе защитника
+        defender = game.current_player
+        cells = _window_cells(game)
+        if self._winning_moves(game, defender, cells):
+            return False
+        if _transforms_after_move(game):
+            replies = game.get_possible_moves(defender)
+        else:
+            replies = self._winning_moves(game, attacker, cells)
+            if not replies:
+                return False
+        for reply in replies:
+            if self.nodes >= self.node_limit:
+                return False
+            child = self._play(game, defender, reply)
+            if child.game_over:
+                if child.winner != attacker:
+                    return False
+                continue
+            if self._attack(child, attacker, depth) is None:
+                return False
+        return True
+
+# ---------------------------------------------------------
+# Битовые доски для вариантов со сдвигами (V2, V3)
+# ---------------------------------------------------------
+# Клетка (r, c) - бит r * width + c, width = size + 1: лишний нулевой столбец
+# справа не даёт линиям "перетекать" через край доски. Порядок битов
+# совпадает с обходом строк сверху вниз, слева направо.
+class BitLayout:
+    def __init__(self, size, win_line):
+        self.size = size
+        self.win_line = win_line
+        self.width = size + 1
+        self.steps = (1, self.width, self.width + 1, self.width - 1)
+        self.board_mask = 0
+        self.odd_cols = 0
+        self.odd_rows = 0
+        self.even_rows = 0
+        self.first_col = 0
+        self.last_col = 0
+        for r in range(size):
+            for c in range(size):
+                bit = 1 << (r * self.width + c)
+                self.board_mask |= bit
+                if c % 2 == 1:
+                    self.odd_cols |= bit
+                if r % 2 == 1:
+                    self.odd_rows |= bit
+                else:
+                    self.even_rows |= bit
+                if c == 0:
+                    self.first_col |= bit
+                if c == size - 1:
+                    self.last_col |= bit
+
+    def bit(self, row, col):
+        return 1 << (row * self.width + col)
+
+_BIT_LAYOUTS = {}
+
+def bit_layout(size, win_line):
+    layout = _BIT_LAYOUTS.get((size, win_line))
+    if layout is None:
+        layout = BitLayout(size, win_line)
+        _BIT_LAYOUTS[(size, win_line)] = layout
+    return layout
+
+def bits_from_board(board, layout):
+    bits = [0, 0, 0]
+    for r, row in enumerate(board):
+        for c, value in enumerate(row):
+            if value != EMPTY:
+                bits[value] |= layout.bit(r, c)
+    return bits
+
+def win_cells(bits, layout):
+    # Маска всех клеток, входящих в линию из win_line фишек (за O(win_line)
+    # операций над целыми числами вместо обхода каждой клетки)
+    cells = 0
+    for step in layout.steps:
+        starts = bits
+        for k in range(1, layout.win_line):
+            starts &= bits >> (k * step)
+            if not starts:
+                break
+        if starts:
+            for k in range(layout.win_line):
+                cells |= starts << (k * step)
+    return cells
+
+def winner_from_bits(bits, layout):
+    # Тот же ответ, что у полного обхода _check_winner_on_board: владелец
+    # первой (в порядке обхода строк) клетки, стоящей в выигрышной линии
+    x_cells = win_cells(bits[PLAYER_X], layout)
+    o_cells = win_cells(bits[PLAYER_O], layout)
+    if not x_cells and not o_cells:
+        return None
+    if not o_cells:
+        return PLAYER_X
+    if not x_cells:
+        return PLAYER_O
+    return PLAYER_X if (x_cells & -x_cells) < (o_cells & -o_cells) else PLAYER_O
+
+def bit_wins_at(bits, index, layout):
+    # Проверка линии через одну клетку прямо по битам игрока
+    for step in layout.steps:
+        count = 1
+        j = index + step
+        while bits >> j & 1:
+            count += 1
+            j += step
+        j = index - step
+        while j >= 0 and bits >> j & 1:
+            count += 1
+            j -= step
+        if count >= layout.win_line:
+            return True
+    return False
+
+def cells_of(mask, layout):
+    # Клетки маски в порядке обхода строк
+    cells = []
+    width = layout.width
+    while mask:
+        low = mask & -mask
+        cells.append(divmod(low.bit_length() - 1, width))
+        mask ^= low
+    return cells
+
+def near_mask(occupied, layout, radius):
+    # Все клетки не дальше radius от фишек: расширение маски по строкам и столбцам
+    near = occupied
+    for _ in range(radius):
+        near |= ((near << 1) | (near >> 1)) & layout.board_mask
+    for _ in range(radius):
+        near |= ((near << layout.width) | (near >> layout.width)) & layout.board_mask
+    return near
+
+def board_from_bits(bits, layout):
+    board = [[EMPTY] * layout.size for _ in range(layout.size)]
+    for player in (PLAYER_X, PLAYER_O):
+        for r, c in cells_of(bits[player], layout):
+            board[r][c] = player
+    return board
+
 # ---------------------------------------------------------
 # Версия 1: гравитация + анимация падения
 # ---------------------------------------------------------
@@ -121,6 +882,7 @@ class GameV1:
     def __init__(self, size, win_line):
         self.size = size
         self.win_line = win_line
+        self.cell_size = cell_size_for(size)
         self.reset()
 
     def reset(self):
@@ -129,6 +891,7 @@ class GameV1:
         self.game_over = False
         self.winner = None
         self.moves_count = 0
+        self.heights = [0] * self.size
 
         self.anim_active = False
         self.anim_col = 0
@@ -140,9 +903,10 @@ class GameV1:
         self.anim_current_y = 0.0
 
     def _find_target_row(self, col):
-        for row in range(self.size - 1, -1, -1):
-            if self.board[row][col] == EMPTY:
-                return row
+        # фишки в столбце всегда лежат стопкой снизу, поэтому хватает высоты
+        height = self.heights[col]
+        if height < self.size:
+            return self.size - 1 - height
         return None
 
     def start_animation(self, col):
@@ -156,8 +920,8 @@ class GameV1:
         self.anim_target_row = target_row
         self.anim_player = self.current_player
         self.anim_start_time = pygame.time.get_ticks()
-        self.anim_start_y = -CELL_SIZE
-        self.anim_end_y = target_row * CELL_SIZE + CELL_SIZE // 2
+        self.anim_start_y = -self.cell_size
+        self.anim_end_y = target_row * self.cell_size + self.cell_size // 2
         self.anim_current_y = self.anim_start_y
         return True
 
@@ -173,6 +937,7 @@ class GameV1:
 
     def _finish_move(self):
         self.board[self.anim_target_row][self.anim_col] = self.anim_player
+        self.heights[self.anim_col] += 1
         self.moves_count += 1
         if self._check_win(self.anim_target_row, self.anim_col):
             self.game_over = True
@@ -206,20 +971,16 @@ class GameV1:
         if self.anim_active:
             return None
         x, y = pos
-        if y >= WINDOW_HEIGHT - INFO_PANEL_HEIGHT:
+        if y >= self.size * self.cell_size:
             return None
-        col = x // CELL_SIZE
+        col = x // self.cell_size
         if 0 <= col < self.size:
             return col
         return None
 
     # Методы для бота
     def get_possible_moves(self, player):
-        moves = []
-        for col in range(self.size):
-            if self._find_target_row(col) is not None:
-                moves.append(col)
-        return moves
+        return [col for col in range(self.size) if self.heights[col] < self.size]
 
     def make_move(self, move):
         col = move
@@ -227,6 +988,7 @@ class GameV1:
         if target_row is None:
             return False
         self.board[target_row][col] = self.current_player
+        self.heights[col] += 1
         self.moves_count += 1
         if self._check_win(target_row, col):
             self.game_over = True
@@ -244,45 +1006,47 @@ class GameV1:
         new.game_over = self.game_over
         new.winner = self.winner
         new.moves_count = self.moves_count
+        new.heights = self.heights[:]
         return new
 
 def draw_board_v1(screen, game, img_x, img_o):
+    cell_size = game.cell_size
     screen.fill(WHITE)
     for i in range(game.size + 1):
-        pygame.draw.line(screen, BLACK, (0, i * CELL_SIZE), (game.size * CELL_SIZE, i * CELL_SIZE), 2)
-        pygame.draw.line(screen, BLACK, (i * CELL_SIZE, 0), (i * CELL_SIZE, game.size * CELL_SIZE), 2)
+        pygame.draw.line(screen, BLACK, (0, i * cell_size), (game.size * cell_size, i * cell_size), 2)
+        pygame.draw.line(screen, BLACK, (i * cell_size, 0), (i * cell_size, game.size * cell_size), 2)
 
     for row in range(game.size):
         for col in range(game.size):
             if game.board[row][col] == PLAYER_X:
                 if img_x:
-                    screen.blit(img_x, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_x, (col * cell_size, row * cell_size))
                 else:
-                    margin = 10
-                    start_pos = (col * CELL_SIZE + margin, row * CELL_SIZE + margin)
-                    end_pos = ((col + 1) * CELL_SIZE - margin, (row + 1) * CELL_SIZE - margin)
+                    margin = cell_size // 5
+                    start_pos = (col * cell_size + margin, row * cell_size + margin)
+                    end_pos = ((col + 1) * cell_size - margin, (row + 1) * cell_size - margin)
                     pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                     pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
             elif game.board[row][col] == PLAYER_O:
                 if img_o:
-                    screen.blit(img_o, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_o, (col * cell_size, row * cell_size))
                 else:
-                    center = (col * CELL_SIZE + CELL_SIZE // 2, row * CELL_SIZE + CELL_SIZE // 2)
-                    radius = CELL_SIZE // 2 - 10
+                    center = (col * cell_size + cell_size // 2, row * cell_size + cell_size // 2)
+                    radius = cell_size // 2 - cell_size // 5
                     pygame.draw.circle(screen, BLUE, center, radius, 3)
 
     if game.anim_active:
         col = game.anim_col
-        center_x = col * CELL_SIZE + CELL_SIZE // 2
+        center_x = col * cell_size + cell_size // 2
         center_y = game.anim_current_y
         if game.anim_player == PLAYER_X:
             if img_x:
                 img_rect = img_x.get_rect(center=(int(center_x), int(center_y)))
                 screen.blit(img_x, img_rect)
             else:
-                margin = 10
-                start_pos = (center_x - CELL_SIZE//2 + margin, center_y - CELL_SIZE//2 + margin)
-                end_pos = (center_x + CELL_SIZE//2 - margin, center_y + CELL_SIZE//2 - margin)
+                margin = cell_size // 5
+                start_pos = (center_x - cell_size//2 + margin, center_y - cell_size//2 + margin)
+                end_pos = (center_x + cell_size//2 - margin, center_y + cell_size//2 - margin)
                 pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                 pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
         else:
@@ -290,10 +1054,10 @@ def draw_board_v1(screen, game, img_x, img_o):
                 img_rect = img_o.get_rect(center=(int(center_x), int(center_y)))
                 screen.blit(img_o, img_rect)
             else:
-                radius = CELL_SIZE // 2 - 10
+                radius = cell_size // 2 - cell_size // 5
                 pygame.draw.circle(screen, BLUE, (int(center_x), int(center_y)), radius, 3)
 
-    panel_rect = pygame.Rect(0, game.size * CELL_SIZE, WINDOW_WIDTH, INFO_PANEL_HEIGHT)
+    panel_rect = pygame.Rect(0, game.size * cell_size, game.size * cell_size, INFO_PANEL_HEIGHT)
     pygame.draw.rect(screen, GRAY, panel_rect)
     font = pygame.font.Font(None, 36)
 
@@ -309,64 +1073,88 @@ def draw_board_v1(screen, game, img_x, img_o):
             text = f"Ходит {PLAYER_SYMBOL[game.current_player]} (кликните в колонку)"
 
     text_surface = font.render(text, True, BLACK)
-    text_rect = text_surface.get_rect(center=(WINDOW_WIDTH // 2, game.size * CELL_SIZE + INFO_PANEL_HEIGHT // 2))
+    text_rect = text_surface.get_rect(center=(game.size * cell_size // 2, game.size * cell_size + INFO_PANEL_HEIGHT // 2))
     screen.blit(text_surface, text_rect)
     pygame.display.flip()
 
-def run_v1():
+def run_v1(size=SIZE, win_line=WIN_LINE):
     pygame.init()
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption(f"[V1] Гравитация {SIZE}x{SIZE} (победа - {WIN_LINE} в ряд)")
+    pygame.display.set_caption(f"[V1] Гравитация {size}x{size} (победа - {win_line} в ряд)")
     clock = pygame.time.Clock()
-    game = GameV1(SIZE, WIN_LINE)
-    bot = Bot(game, max_depth=1)
-    img_x, img_o = load_images()
-    running = True
+    game = GameV1(size, win_line)
+    board_pixels = size * game.cell_size
+    screen = pygame.display.set_mode((board_pixels, board_pixels + INFO_PANEL_HEIGHT))
+    bot = make_window_bot(1, game)
+    thinker = BotThinker(bot)
+    img_x, img_o = load_images(game.cell_size)
 
     while not game.game_over:
         current_time = pygame.time.get_ticks()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                thinker.shutdown()
                 pygame.quit()
                 return 0  # при закрытии окна считаем проигрышем
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and game.current_player == PLAYER_X:
                 pos = pygame.mouse.get_pos()
                 col = game.get_col_from_pos(pos)
                 if col is not None:
                     game.start_animation(col)
 
         if not game.game_over and game.current_player == PLAYER_O and not game.anim_active:
-            move = bot.get_best_move()
-            if move is not None:
+            if not thinker.is_thinking():
+                thinker.start(game)
+            done, move = thinker.poll()
+            if done and move is not None:
                 game.start_animation(move)
+        elif not game.game_over and not game.anim_active:
+            thinker.ponder(game)
 
         game.update_animation(current_time)
         draw_board_v1(screen, game, img_x, img_o)
         clock.tick(60)
 
+    thinker.shutdown()
     pygame.time.wait(1000)  # небольшая пауза, чтобы игрок увидел результат
     pygame.quit()
     # Возвращаем 1, если победил X или ничья, иначе 0
-    if game.winner == PLAYER_X or game.winner is None:
-        return 1
-    else:
-        return 0
+    return game_result(game)
 
 # ---------------------------------------------------------
 # Версия 2: сдвиг нечётных столбцов вниз
 # ---------------------------------------------------------
 class GameV2:
+    # Доска хранится только в битах игроков (self.bits), сдвиг - несколько
+    # операций над целыми числами. Списки self.board собираются из битов
+    # по требованию (для отрисовки и оценки) и кэшируются до следующего сдвига.
     def __init__(self, size, win_line):
         self.size = size
         self.win_line = win_line
+        self.cell_size = cell_size_for(size)
         self.reset()
 
     def reset(self):
-        self.board = [[EMPTY for _ in range(self.size)] for _ in range(self.size)]
         self.current_player = PLAYER_X
         self.game_over = False
         self.winner = None
         self.moves_count = 0
+        self.layout = bit_layout(self.size, self.win_line)
+        self.bits = [0, 0, 0]
+        self._board = None
+
+    @property
+    def board(self):
+        if self._board is None:
+            self._board = board_from_bits(self.bits, self.layout)
+        return self._board
+
+    def cell(self, row, col):
+        bit = self.layout.bit(row, col)
+        if self.bits[PLAYER_X] & bit:
+            return PLAYER_X
+        if self.bits[PLAYER_O] & bit:
+            return PLAYER_O
+        return EMPTY
 
     def make_move(self, move):
         row, col = move
@@ -374,10 +1162,12 @@ class GameV2:
             return False
         if not (0 <= row < self.size and 0 <= col < self.size):
             return False
-        if self.board[row][col] != EMPTY:
+        if self.cell(row, col) != EMPTY:
             return False
 
-        self.board[row][col] = self.current_player
+        self.bits[self.current_player] |= self.layout.bit(row, col)
+        if self._board is not None:
+            self._board[row][col] = self.current_player
         self.moves_count += 1
 
         if self.check_win(row, col):
@@ -396,14 +1186,20 @@ class GameV2:
         return True
 
     def _shift_columns(self):
-        for col in range(1, self.size, 2):
-            bottom = self.board[self.size - 1][col]
-            for row in range(self.size - 1, 0, -1):
-                self.board[row][col] = self.board[row - 1][col]
-            self.board[0][col] = bottom
+        # нечётные столбцы сдвигаются целиком: нижняя строка уходит наверх,
+        # остальные опускаются на одну строку
+        layout = self.layout
+        wrap = (self.size - 1) * layout.width
+        for player in (PLAYER_X, PLAYER_O):
+            bits = self.bits[player]
+            moving = bits & layout.odd_cols
+            self.bits[player] = ((bits & ~layout.odd_cols)
+                                 | ((moving << layout.width) & layout.board_mask)
+                                 | (moving >> wrap))
+        self._board = None
 
     def _check_game_over_after_shift(self):
-        winner = self._check_winner_on_board()
+        winner = winner_from_bits(self.bits, self.layout)
         if winner is not None:
             self.game_over = True
             self.winner = winner
@@ -413,6 +1209,7 @@ class GameV2:
             self.winner = None
 
     def _check_winner_on_board(self):
+        # Полный обход доски; оставлен как эталон для winner_from_bits
         for r in range(self.size):
             for c in range(self.size):
                 player = self.board[r][c]
@@ -422,79 +1219,72 @@ class GameV2:
         return None
 
     def check_win(self, row, col):
-        player = self.board[row][col]
+        player = self.cell(row, col)
         if player == EMPTY:
             return False
-        directions = [(1, 0), (0, 1), (1, 1), (1, -1)]
-        for dr, dc in directions:
-            count = 1
-            r, c = row + dr, col + dc
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == player:
-                count += 1
-                r += dr
-                c += dc
-            r, c = row - dr, col - dc
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == player:
-                count += 1
-                r -= dr
-                c -= dc
-            if count >= self.win_line:
-                return True
-        return False
+        return bit_wins_at(self.bits[player], row * self.layout.width + col, self.layout)
+
+    def wins_with(self, row, col, player):
+        bit = self.layout.bit(row, col)
+        return bit_wins_at(self.bits[player] | bit, row * self.layout.width + col, self.layout)
 
     def get_cell_from_pos(self, pos):
         x, y = pos
-        if y >= WINDOW_HEIGHT - INFO_PANEL_HEIGHT:
+        if y >= self.size * self.cell_size:
             return None
-        col = x // CELL_SIZE
-        row = y // CELL_SIZE
+        col = x // self.cell_size
+        row = y // self.cell_size
         if 0 <= row < self.size and 0 <= col < self.size:
             return row, col
         return None
 
     def get_possible_moves(self, player):
-        moves = []
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r][c] == EMPTY:
-                    moves.append((r, c))
-        return moves
+        occupied = self.bits[PLAYER_X] | self.bits[PLAYER_O]
+        return cells_of(self.layout.board_mask & ~occupied, self.layout)
+
+    def candidate_cells(self):
+        occupied = self.bits[PLAYER_X] | self.bits[PLAYER_O]
+        return cells_of(near_mask(occupied, self.layout, CANDIDATE_RADIUS) & ~occupied, self.layout)
+
+    def get_candidate_moves(self, player):
+        return candidate_moves(self, player)
 
     def copy(self):
         new = GameV2(self.size, self.win_line)
-        new.board = [row[:] for row in self.board]
         new.current_player = self.current_player
         new.game_over = self.game_over
         new.winner = self.winner
         new.moves_count = self.moves_count
+        new.bits = self.bits[:]
         return new
 
 def draw_board_v2(screen, game, img_x, img_o):
+    cell_size = game.cell_size
     screen.fill(WHITE)
     for i in range(game.size + 1):
-        pygame.draw.line(screen, BLACK, (0, i * CELL_SIZE), (game.size * CELL_SIZE, i * CELL_SIZE), 2)
-        pygame.draw.line(screen, BLACK, (i * CELL_SIZE, 0), (i * CELL_SIZE, game.size * CELL_SIZE), 2)
+        pygame.draw.line(screen, BLACK, (0, i * cell_size), (game.size * cell_size, i * cell_size), 2)
+        pygame.draw.line(screen, BLACK, (i * cell_size, 0), (i * cell_size, game.size * cell_size), 2)
 
     for row in range(game.size):
         for col in range(game.size):
             if game.board[row][col] == PLAYER_X:
                 if img_x:
-                    screen.blit(img_x, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_x, (col * cell_size, row * cell_size))
                 else:
-                    margin = 10
-                    start_pos = (col * CELL_SIZE + margin, row * CELL_SIZE + margin)
-                    end_pos = ((col + 1) * CELL_SIZE - margin, (row + 1) * CELL_SIZE - margin)
+                    margin = cell_size // 5
+                    start_pos = (col * cell_size + margin, row * cell_size + margin)
+                    end_pos = ((col + 1) * cell_size - margin, (row + 1) * cell_size - margin)
                     pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                     pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
             elif game.board[row][col] == PLAYER_O:
                 if img_o:
-                    screen.blit(img_o, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_o, (col * cell_size, row * cell_size))
                 else:
-                    center = (col * CELL_SIZE + CELL_SIZE // 2, row * CELL_SIZE + CELL_SIZE // 2)
-                    radius = CELL_SIZE // 2 - 10
+                    center = (col * cell_size + cell_size // 2, row * cell_size + cell_size // 2)
+                    radius = cell_size // 2 - cell_size // 5
                     pygame.draw.circle(screen, BLUE, center, radius, 3)
 
-    panel_rect = pygame.Rect(0, game.size * CELL_SIZE, WINDOW_WIDTH, INFO_PANEL_HEIGHT)
+    panel_rect = pygame.Rect(0, game.size * cell_size, game.size * cell_size, INFO_PANEL_HEIGHT)
     pygame.draw.rect(screen, GRAY, panel_rect)
     font = pygame.font.Font(None, 36)
 
@@ -507,26 +1297,28 @@ def draw_board_v2(screen, game, img_x, img_o):
         text = f"Ходит {PLAYER_SYMBOL[game.current_player]}"
 
     text_surface = font.render(text, True, BLACK)
-    text_rect = text_surface.get_rect(center=(WINDOW_WIDTH // 2, game.size * CELL_SIZE + INFO_PANEL_HEIGHT // 2))
+    text_rect = text_surface.get_rect(center=(game.size * cell_size // 2, game.size * cell_size + INFO_PANEL_HEIGHT // 2))
     screen.blit(text_surface, text_rect)
     pygame.display.flip()
 
-def run_v2():
+def run_v2(size=SIZE, win_line=WIN_LINE):
     pygame.init()
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption(f"[V2] Сдвиг столбцов {SIZE}x{SIZE} (победа - {WIN_LINE} в ряд)")
+    pygame.display.set_caption(f"[V2] Сдвиг столбцов {size}x{size} (победа - {win_line} в ряд)")
     clock = pygame.time.Clock()
-    game = GameV2(SIZE, WIN_LINE)
-    bot = Bot(game, max_depth=1)
-    img_x, img_o = load_images()
-    running = True
+    game = GameV2(size, win_line)
+    board_pixels = size * game.cell_size
+    screen = pygame.display.set_mode((board_pixels, board_pixels + INFO_PANEL_HEIGHT))
+    bot = make_window_bot(2, game)
+    thinker = BotThinker(bot)
+    img_x, img_o = load_images(game.cell_size)
 
     while not game.game_over:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                thinker.shutdown()
                 pygame.quit()
                 return 0
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and game.current_player == PLAYER_X:
                 pos = pygame.mouse.get_pos()
                 cell = game.get_cell_from_pos(pos)
                 if cell is not None:
@@ -534,37 +1326,57 @@ def run_v2():
                     game.make_move((row, col))
 
         if not game.game_over and game.current_player == PLAYER_O:
-            move = bot.get_best_move()
-            if move is not None:
+            if not thinker.is_thinking():
+                thinker.start(game)
+            done, move = thinker.poll()
+            if done and move is not None:
                 game.make_move(move)
+        elif not game.game_over:
+            thinker.ponder(game)
 
         draw_board_v2(screen, game, img_x, img_o)
         clock.tick(30)
 
+    thinker.shutdown()
     pygame.time.wait(1000)
     pygame.quit()
-    if game.winner == PLAYER_X or game.winner is None:
-        return 1
-    else:
-        return 0
+    return game_result(game)
 
 # ---------------------------------------------------------
 # Версия 3: сдвиг строк (чередование чётности и направления)
 # ---------------------------------------------------------
 class GameV3:
+    # Доска хранится как в GameV2: биты игроков + собираемый по требованию self.board
     def __init__(self, size, win_line):
         self.size = size
         self.win_line = win_line
+        self.cell_size = cell_size_for(size)
         self.reset()
 
     def reset(self):
-        self.board = [[EMPTY for _ in range(self.size)] for _ in range(self.size)]
         self.current_player = PLAYER_X
         self.game_over = False
         self.winner = None
         self.moves_count = 0
         self.shift_direction = 1
         self.shift_parity = 0
+        self.layout = bit_layout(self.size, self.win_line)
+        self.bits = [0, 0, 0]
+        self._board = None
+
+    @property
+    def board(self):
+        if self._board is None:
+            self._board = board_from_bits(self.bits, self.layout)
+        return self._board
+
+    def cell(self, row, col):
+        bit = self.layout.bit(row, col)
+        if self.bits[PLAYER_X] & bit:
+            return PLAYER_X
+        if self.bits[PLAYER_O] & bit:
+            return PLAYER_O
+        return EMPTY
 
     def make_move(self, move):
         row, col = move
@@ -572,10 +1384,12 @@ class GameV3:
             return False
         if not (0 <= row < self.size and 0 <= col < self.size):
             return False
-        if self.board[row][col] != EMPTY:
+        if self.cell(row, col) != EMPTY:
             return False
 
-        self.board[row][col] = self.current_player
+        self.bits[self.current_player] |= self.layout.bit(row, col)
+        if self._board is not None:
+            self._board[row][col] = self.current_player
         self.moves_count += 1
 
         if self.check_win(row, col):
@@ -596,26 +1410,21 @@ class GameV3:
         return True
 
     def _shift_rows(self, parity, direction):
-        if parity == 0:
-            rows_to_shift = range(1, self.size, 2)
-        else:
-            rows_to_shift = range(0, self.size, 2)
-
-        if direction == 1:  # вправо
-            for row in rows_to_shift:
-                last = self.board[row][self.size - 1]
-                for col in range(self.size - 1, 0, -1):
-                    self.board[row][col] = self.board[row][col - 1]
-                self.board[row][0] = last
-        else:  # влево
-            for row in rows_to_shift:
-                first = self.board[row][0]
-                for col in range(self.size - 1):
-                    self.board[row][col] = self.board[row][col + 1]
-                self.board[row][self.size - 1] = first
+        # строки сдвигаются на один бит, выпавший край переносится на другую сторону
+        layout = self.layout
+        rows_mask = layout.odd_rows if parity == 0 else layout.even_rows
+        for player in (PLAYER_X, PLAYER_O):
+            bits = self.bits[player]
+            moving = bits & rows_mask
+            if direction == 1:  # вправо
+                moved = ((moving << 1) & layout.board_mask) | ((moving & layout.last_col) >> (self.size - 1))
+            else:  # влево
+                moved = ((moving >> 1) & layout.board_mask) | ((moving & layout.first_col) << (self.size - 1))
+            self.bits[player] = (bits & ~rows_mask) | moved
+        self._board = None
 
     def _check_game_over_after_shift(self):
-        winner = self._check_winner_on_board()
+        winner = winner_from_bits(self.bits, self.layout)
         if winner is not None:
             self.game_over = True
             self.winner = winner
@@ -625,6 +1434,7 @@ class GameV3:
             self.winner = None
 
     def _check_winner_on_board(self):
+        # Полный обход доски; оставлен как эталон для winner_from_bits
         for r in range(self.size):
             for c in range(self.size):
                 player = self.board[r][c]
@@ -634,81 +1444,74 @@ class GameV3:
         return None
 
     def check_win(self, row, col):
-        player = self.board[row][col]
+        player = self.cell(row, col)
         if player == EMPTY:
             return False
-        directions = [(1, 0), (0, 1), (1, 1), (1, -1)]
-        for dr, dc in directions:
-            count = 1
-            r, c = row + dr, col + dc
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == player:
-                count += 1
-                r += dr
-                c += dc
-            r, c = row - dr, col - dc
-            while 0 <= r < self.size and 0 <= c < self.size and self.board[r][c] == player:
-                count += 1
-                r -= dr
-                c -= dc
-            if count >= self.win_line:
-                return True
-        return False
+        return bit_wins_at(self.bits[player], row * self.layout.width + col, self.layout)
+
+    def wins_with(self, row, col, player):
+        bit = self.layout.bit(row, col)
+        return bit_wins_at(self.bits[player] | bit, row * self.layout.width + col, self.layout)
 
     def get_cell_from_pos(self, pos):
         x, y = pos
-        if y >= WINDOW_HEIGHT - INFO_PANEL_HEIGHT:
+        if y >= self.size * self.cell_size:
             return None
-        col = x // CELL_SIZE
-        row = y // CELL_SIZE
+        col = x // self.cell_size
+        row = y // self.cell_size
         if 0 <= row < self.size and 0 <= col < self.size:
             return row, col
         return None
 
     def get_possible_moves(self, player):
-        moves = []
-        for r in range(self.size):
-            for c in range(self.size):
-                if self.board[r][c] == EMPTY:
-                    moves.append((r, c))
-        return moves
+        occupied = self.bits[PLAYER_X] | self.bits[PLAYER_O]
+        return cells_of(self.layout.board_mask & ~occupied, self.layout)
+
+    def candidate_cells(self):
+        occupied = self.bits[PLAYER_X] | self.bits[PLAYER_O]
+        return cells_of(near_mask(occupied, self.layout, CANDIDATE_RADIUS) & ~occupied, self.layout)
+
+    def get_candidate_moves(self, player):
+        return candidate_moves(self, player)
 
     def copy(self):
         new = GameV3(self.size, self.win_line)
-        new.board = [row[:] for row in self.board]
         new.current_player = self.current_player
         new.game_over = self.game_over
         new.winner = self.winner
         new.moves_count = self.moves_count
         new.shift_direction = self.shift_direction
         new.shift_parity = self.shift_parity
+        new.bits = self.bits[:]
         return new
 
 def draw_board_v3(screen, game, img_x, img_o):
+    cell_size = game.cell_size
     screen.fill(WHITE)
     for i in range(game.size + 1):
-        pygame.draw.line(screen, BLACK, (0, i * CELL_SIZE), (game.size * CELL_SIZE, i * CELL_SIZE), 2)
-        pygame.draw.line(screen, BLACK, (i * CELL_SIZE, 0), (i * CELL_SIZE, game.size * CELL_SIZE), 2)
+        pygame.draw.line(screen, BLACK, (0, i * cell_size), (game.size * cell_size, i * cell_size), 2)
+        pygame.draw.line(screen, BLACK, (i * cell_size, 0), (i * cell_size, game.size * cell_size), 2)
 
     for row in range(game.size):
         for col in range(game.size):
             if game.board[row][col] == PLAYER_X:
                 if img_x:
-                    screen.blit(img_x, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_x, (col * cell_size, row * cell_size))
                 else:
-                    margin = 10
-                    start_pos = (col * CELL_SIZE + margin, row * CELL_SIZE + margin)
-                    end_pos = ((col + 1) * CELL_SIZE - margin, (row + 1) * CELL_SIZE - margin)
+                    margin = cell_size // 5
+                    start_pos = (col * cell_size + margin, row * cell_size + margin)
+                    end_pos = ((col + 1) * cell_size - margin, (row + 1) * cell_size - margin)
                     pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                     pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
             elif game.board[row][col] == PLAYER_O:
                 if img_o:
-                    screen.blit(img_o, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_o, (col * cell_size, row * cell_size))
                 else:
-                    center = (col * CELL_SIZE + CELL_SIZE // 2, row * CELL_SIZE + CELL_SIZE // 2)
-                    radius = CELL_SIZE // 2 - 10
+                    center = (col * cell_size + cell_size // 2, row * cell_size + cell_size // 2)
+                    radius = cell_size // 2 - cell_size // 5
                     pygame.draw.circle(screen, BLUE, center, radius, 3)
 
-    panel_rect = pygame.Rect(0, game.size * CELL_SIZE, WINDOW_WIDTH, INFO_PANEL_HEIGHT)
+    panel_rect = pygame.Rect(0, game.size * cell_size, game.size * cell_size, INFO_PANEL_HEIGHT)
     pygame.draw.rect(screen, GRAY, panel_rect)
     font = pygame.font.Font(None, 36)
 
@@ -721,26 +1524,28 @@ def draw_board_v3(screen, game, img_x, img_o):
         text = f"Ходит {PLAYER_SYMBOL[game.current_player]}"
 
     text_surface = font.render(text, True, BLACK)
-    text_rect = text_surface.get_rect(center=(WINDOW_WIDTH // 2, game.size * CELL_SIZE + INFO_PANEL_HEIGHT // 2))
+    text_rect = text_surface.get_rect(center=(game.size * cell_size // 2, game.size * cell_size + INFO_PANEL_HEIGHT // 2))
     screen.blit(text_surface, text_rect)
     pygame.display.flip()
 
-def run_v3():
+def run_v3(size=SIZE, win_line=WIN_LINE):
     pygame.init()
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption(f"[V3] Сдвиг строк {SIZE}x{SIZE} (победа - {WIN_LINE} в ряд)")
+    pygame.display.set_caption(f"[V3] Сдвиг строк {size}x{size} (победа - {win_line} в ряд)")
     clock = pygame.time.Clock()
-    game = GameV3(SIZE, WIN_LINE)
-    bot = Bot(game, max_depth=1)
-    img_x, img_o = load_images()
-    running = True
+    game = GameV3(size, win_line)
+    board_pixels = size * game.cell_size
+    screen = pygame.display.set_mode((board_pixels, board_pixels + INFO_PANEL_HEIGHT))
+    bot = make_window_bot(3, game)
+    thinker = BotThinker(bot)
+    img_x, img_o = load_images(game.cell_size)
 
     while not game.game_over:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                thinker.shutdown()
                 pygame.quit()
                 return 0
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and game.current_player == PLAYER_X:
                 pos = pygame.mouse.get_pos()
                 cell = game.get_cell_from_pos(pos)
                 if cell is not None:
@@ -748,34 +1553,37 @@ def run_v3():
                     game.make_move((row, col))
 
         if not game.game_over and game.current_player == PLAYER_O:
-            move = bot.get_best_move()
-            if move is not None:
+            if not thinker.is_thinking():
+                thinker.start(game)
+            done, move = thinker.poll()
+            if done and move is not None:
                 game.make_move(move)
+        elif not game.game_over:
+            thinker.ponder(game)
 
         draw_board_v3(screen, game, img_x, img_o)
         clock.tick(30)
 
+    thinker.shutdown()
     pygame.time.wait(1000)
     pygame.quit()
-    if game.winner == PLAYER_X or game.winner is None:
-        return 1
-    else:
-        return 0
+    return game_result(game)
 
 # ---------------------------------------------------------
 # Версия 4: гравитация + поворот доски каждые 3 хода + анимация падения
 # ---------------------------------------------------------
 class FallingPiece:
-    def __init__(self, player, start_row, start_col, end_row, end_col):
+    def __init__(self, player, start_row, start_col, end_row, end_col, cell_size):
         self.player = player
+        self.cell_size = cell_size
         self.start_row = start_row
         self.start_col = start_col
         self.end_row = end_row
         self.end_col = end_col
-        self.start_x = start_col * CELL_SIZE + CELL_SIZE // 2
-        self.start_y = start_row * CELL_SIZE + CELL_SIZE // 2
-        self.end_x = end_col * CELL_SIZE + CELL_SIZE // 2
-        self.end_y = end_row * CELL_SIZE + CELL_SIZE // 2
+        self.start_x = start_col * self.cell_size + self.cell_size // 2
+        self.start_y = start_row * self.cell_size + self.cell_size // 2
+        self.end_x = end_col * self.cell_size + self.cell_size // 2
+        self.end_y = end_row * self.cell_size + self.cell_size // 2
         self.progress = 0.0
 
     def update(self, progress):
@@ -786,10 +1594,15 @@ class FallingPiece:
         y = self.start_y + (self.end_y - self.start_y) * self.progress
         return x, y
 
+def rotate_clockwise(board):
+    # rotated[j][size-1-i] = board[i][j]
+    return [list(row) for row in zip(*reversed(board))]
+
 class GameV4:
     def __init__(self, size, win_line):
         self.size = size
         self.win_line = win_line
+        self.cell_size = cell_size_for(size)
         self.reset()
 
     def reset(self):
@@ -798,6 +1611,7 @@ class GameV4:
         self.game_over = False
         self.winner = None
         self.moves_count = 0
+        self.heights = [0] * self.size
         self.marker_pos = (self.size - 1, self.size - 1)
 
         self.anim_active = False
@@ -815,11 +1629,13 @@ class GameV4:
         self.rotation_fall_start_time = 0
         self.falling_pieces = []
         self.post_rotation_board = None
+        self.post_rotation_heights = None
 
     def _find_target_row(self, col):
-        for row in range(self.size - 1, -1, -1):
-            if self.board[row][col] == EMPTY:
-                return row
+        # фишки в столбце всегда лежат стопкой снизу, поэтому хватает высоты
+        height = self.heights[col]
+        if height < self.size:
+            return self.size - 1 - height
         return None
 
     def start_animation(self, col):
@@ -833,8 +1649,8 @@ class GameV4:
         self.anim_target_row = target_row
         self.anim_player = self.current_player
         self.anim_start_time = pygame.time.get_ticks()
-        self.anim_start_y = -CELL_SIZE
-        self.anim_end_y = target_row * CELL_SIZE + CELL_SIZE // 2
+        self.anim_start_y = -self.cell_size
+        self.anim_end_y = target_row * self.cell_size + self.cell_size // 2
         self.anim_current_y = self.anim_start_y
         return True
 
@@ -861,6 +1677,7 @@ class GameV4:
 
     def _finish_move(self):
         self.board[self.anim_target_row][self.anim_col] = self.anim_player
+        self.heights[self.anim_col] += 1
         self.moves_count += 1
 
         if self._check_win(self.anim_target_row, self.anim_col):
@@ -877,11 +1694,7 @@ class GameV4:
         self.anim_active = False
 
     def _start_rotation_delay(self):
-        rotated_board = [[EMPTY] * self.size for _ in range(self.size)]
-        for i in range(self.size):
-            for j in range(self.size):
-                rotated_board[j][self.size - 1 - i] = self.board[i][j]
-        self.board = rotated_board
+        self.board = rotate_clockwise(self.board)
 
         r, c = self.marker_pos
         self.marker_pos = (c, self.size - 1 - r)
@@ -891,24 +1704,23 @@ class GameV4:
 
     def _start_fall_after_delay(self):
         self.pre_fall_delay_active = False
-        self.post_rotation_board = self._apply_gravity_to_board(self.board)
+        self.post_rotation_board, self.post_rotation_heights = self._apply_gravity_to_board(self.board)
 
+        # фишки столбца сохраняют порядок: k-я сверху ложится в строку size - height + k
         self.falling_pieces = []
-        for col in range(self.size):
-            pieces_in_col = []
-            for row in range(self.size):
-                if self.board[row][col] != EMPTY:
-                    pieces_in_col.append((row, self.board[row][col]))
-            target_rows = [r for r in range(self.size - 1, -1, -1) if self.post_rotation_board[r][col] != EMPTY]
-            for idx, (src_row, player) in enumerate(pieces_in_col):
-                tgt_row = target_rows[len(target_rows) - 1 - idx]
-                self.falling_pieces.append(FallingPiece(player, src_row, col, tgt_row, col))
+        for col, column in enumerate(zip(*self.board)):
+            target_row = self.size - self.post_rotation_heights[col]
+            for src_row, player in enumerate(column):
+                if player != EMPTY:
+                    self.falling_pieces.append(FallingPiece(player, src_row, col, target_row, col, self.cell_size))
+                    target_row += 1
 
         self.rotation_fall_active = True
         self.rotation_fall_start_time = pygame.time.get_ticks()
 
     def _finish_rotation_fall(self):
         self.board = self.post_rotation_board
+        self.heights = self.post_rotation_heights
         self.rotation_fall_active = False
         self.falling_pieces = []
 
@@ -921,16 +1733,25 @@ class GameV4:
             self.winner = None
 
     def _apply_gravity_to_board(self, board):
-        new_board = [[EMPTY] * self.size for _ in range(self.size)]
-        for col in range(self.size):
-            pieces = []
-            for row in range(self.size - 1, -1, -1):
-                if board[row][col] != EMPTY:
-                    pieces.append(board[row][col])
-            for row in range(self.size - 1, -1, -1):
-                if pieces:
-                    new_board[row][col] = pieces.pop(0)
-        return new_board
+        # Возвращает осевшую доску и высоты её столбцов
+        return self._settle_columns(zip(*board))
+
+    def _rotate_and_settle(self, board):
+        # Поворот по часовой стрелке и падение за один проход: после поворота
+        # столбец c - это строка size-1-c, прочитанная слева направо, так что
+        # сами строки и есть столбцы повёрнутой доски
+        return self._settle_columns(reversed(board))
+
+    def _settle_columns(self, columns):
+        # Столбцы перечисляются сверху вниз; фишки прижимаются ко дну,
+        # сохраняя порядок, затем столбцы транспонируются обратно в строки
+        settled = []
+        heights = []
+        for column in columns:
+            pieces = [player for player in column if player != EMPTY]
+            heights.append(len(pieces))
+            settled.append([EMPTY] * (self.size - len(pieces)) + pieces)
+        return [list(row) for row in zip(*settled)], heights
 
     def _check_win_any(self):
         for r in range(self.size):
@@ -940,10 +1761,7 @@ class GameV4:
         return None
 
     def _is_board_full(self):
-        for row in self.board:
-            if EMPTY in row:
-                return False
-        return True
+        return all(height == self.size for height in self.heights)
 
     def _check_win(self, row, col):
         player = self.board[row][col]
@@ -968,19 +1786,15 @@ class GameV4:
         if self.anim_active or self.rotation_fall_active or self.pre_fall_delay_active or self.game_over:
             return None
         x, y = pos
-        if y >= WINDOW_HEIGHT - INFO_PANEL_HEIGHT:
+        if y >= self.size * self.cell_size:
             return None
-        col = x // CELL_SIZE
+        col = x // self.cell_size
         if 0 <= col < self.size:
             return col
         return None
 
     def get_possible_moves(self, player):
-        moves = []
-        for col in range(self.size):
-            if self._find_target_row(col) is not None:
-                moves.append(col)
-        return moves
+        return [col for col in range(self.size) if self.heights[col] < self.size]
 
     def make_move(self, move):
         col = move
@@ -988,6 +1802,7 @@ class GameV4:
         if target_row is None:
             return False
         self.board[target_row][col] = self.current_player
+        self.heights[col] += 1
         self.moves_count += 1
         if self._check_win(target_row, col):
             self.game_over = True
@@ -997,12 +1812,7 @@ class GameV4:
             self.game_over = True
             return True
         if not self.game_over and self.moves_count % 3 == 0:
-            rotated = [[EMPTY]*self.size for _ in range(self.size)]
-            for i in range(self.size):
-                for j in range(self.size):
-                    rotated[j][self.size-1-i] = self.board[i][j]
-            self.board = rotated
-            self.board = self._apply_gravity_to_board(self.board)
+            self.board, self.heights = self._rotate_and_settle(self.board)
             winner = self._check_win_any()
             if winner is not None:
                 self.game_over = True
@@ -1023,14 +1833,16 @@ class GameV4:
         new.game_over = self.game_over
         new.winner = self.winner
         new.moves_count = self.moves_count
+        new.heights = self.heights[:]
         new.marker_pos = self.marker_pos
         return new
 
 def draw_board_v4(screen, game, img_x, img_o):
+    cell_size = game.cell_size
     screen.fill(WHITE)
     for i in range(game.size + 1):
-        pygame.draw.line(screen, BLACK, (0, i * CELL_SIZE), (game.size * CELL_SIZE, i * CELL_SIZE), 2)
-        pygame.draw.line(screen, BLACK, (i * CELL_SIZE, 0), (i * CELL_SIZE, game.size * CELL_SIZE), 2)
+        pygame.draw.line(screen, BLACK, (0, i * cell_size), (game.size * cell_size, i * cell_size), 2)
+        pygame.draw.line(screen, BLACK, (i * cell_size, 0), (i * cell_size, game.size * cell_size), 2)
 
     if game.rotation_fall_active:
         for piece in game.falling_pieces:
@@ -1040,9 +1852,9 @@ def draw_board_v4(screen, game, img_x, img_o):
                     img_rect = img_x.get_rect(center=(int(x), int(y)))
                     screen.blit(img_x, img_rect)
                 else:
-                    margin = 10
-                    start_pos = (x - CELL_SIZE//2 + margin, y - CELL_SIZE//2 + margin)
-                    end_pos = (x + CELL_SIZE//2 - margin, y + CELL_SIZE//2 - margin)
+                    margin = cell_size // 5
+                    start_pos = (x - cell_size//2 + margin, y - cell_size//2 + margin)
+                    end_pos = (x + cell_size//2 - margin, y + cell_size//2 - margin)
                     pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                     pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
             else:
@@ -1050,40 +1862,40 @@ def draw_board_v4(screen, game, img_x, img_o):
                     img_rect = img_o.get_rect(center=(int(x), int(y)))
                     screen.blit(img_o, img_rect)
                 else:
-                    radius = CELL_SIZE // 2 - 10
+                    radius = cell_size // 2 - cell_size // 5
                     pygame.draw.circle(screen, BLUE, (int(x), int(y)), radius, 3)
     else:
         for row in range(game.size):
             for col in range(game.size):
                 if game.board[row][col] == PLAYER_X:
                     if img_x:
-                        screen.blit(img_x, (col * CELL_SIZE, row * CELL_SIZE))
+                        screen.blit(img_x, (col * cell_size, row * cell_size))
                     else:
-                        margin = 10
-                        start_pos = (col * CELL_SIZE + margin, row * CELL_SIZE + margin)
-                        end_pos = ((col + 1) * CELL_SIZE - margin, (row + 1) * CELL_SIZE - margin)
+                        margin = cell_size // 5
+                        start_pos = (col * cell_size + margin, row * cell_size + margin)
+                        end_pos = ((col + 1) * cell_size - margin, (row + 1) * cell_size - margin)
                         pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                         pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
                 elif game.board[row][col] == PLAYER_O:
                     if img_o:
-                        screen.blit(img_o, (col * CELL_SIZE, row * CELL_SIZE))
+                        screen.blit(img_o, (col * cell_size, row * cell_size))
                     else:
-                        center = (col * CELL_SIZE + CELL_SIZE // 2, row * CELL_SIZE + CELL_SIZE // 2)
-                        radius = CELL_SIZE // 2 - 10
+                        center = (col * cell_size + cell_size // 2, row * cell_size + cell_size // 2)
+                        radius = cell_size // 2 - cell_size // 5
                         pygame.draw.circle(screen, BLUE, center, radius, 3)
 
     if game.anim_active:
         col = game.anim_col
-        center_x = col * CELL_SIZE + CELL_SIZE // 2
+        center_x = col * cell_size + cell_size // 2
         center_y = game.anim_current_y
         if game.anim_player == PLAYER_X:
             if img_x:
                 img_rect = img_x.get_rect(center=(int(center_x), int(center_y)))
                 screen.blit(img_x, img_rect)
             else:
-                margin = 10
-                start_pos = (center_x - CELL_SIZE//2 + margin, center_y - CELL_SIZE//2 + margin)
-                end_pos = (center_x + CELL_SIZE//2 - margin, center_y + CELL_SIZE//2 - margin)
+                margin = cell_size // 5
+                start_pos = (center_x - cell_size//2 + margin, center_y - cell_size//2 + margin)
+                end_pos = (center_x + cell_size//2 - margin, center_y + cell_size//2 - margin)
                 pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                 pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
         else:
@@ -1091,10 +1903,10 @@ def draw_board_v4(screen, game, img_x, img_o):
                 img_rect = img_o.get_rect(center=(int(center_x), int(center_y)))
                 screen.blit(img_o, img_rect)
             else:
-                radius = CELL_SIZE // 2 - 10
+                radius = cell_size // 2 - cell_size // 5
                 pygame.draw.circle(screen, BLUE, (int(center_x), int(center_y)), radius, 3)
 
-    panel_rect = pygame.Rect(0, game.size * CELL_SIZE, WINDOW_WIDTH, INFO_PANEL_HEIGHT)
+    panel_rect = pygame.Rect(0, game.size * cell_size, game.size * cell_size, INFO_PANEL_HEIGHT)
     pygame.draw.rect(screen, GRAY, panel_rect)
     font = pygame.font.Font(None, 36)
 
@@ -1114,7 +1926,7 @@ def draw_board_v4(screen, game, img_x, img_o):
             text = f"Ходит {PLAYER_SYMBOL[game.current_player]} (кликните в колонку)"
 
     text_surface = font.render(text, True, BLACK)
-    text_rect = text_surface.get_rect(center=(WINDOW_WIDTH // 2, game.size * CELL_SIZE + INFO_PANEL_HEIGHT // 2))
+    text_rect = text_surface.get_rect(center=(game.size * cell_size // 2, game.size * cell_size + INFO_PANEL_HEIGHT // 2))
     screen.blit(text_surface, text_rect)
 
     if not game.game_over:
@@ -1122,61 +1934,65 @@ def draw_board_v4(screen, game, img_x, img_o):
         rect_size = 12
         margin = 2
         if marker_row == 0 and marker_col == 0:
-            x = marker_col * CELL_SIZE + margin
-            y = marker_row * CELL_SIZE + margin
+            x = marker_col * cell_size + margin
+            y = marker_row * cell_size + margin
         elif marker_row == 0 and marker_col == game.size - 1:
-            x = marker_col * CELL_SIZE + CELL_SIZE - rect_size - margin
-            y = marker_row * CELL_SIZE + margin
+            x = marker_col * cell_size + cell_size - rect_size - margin
+            y = marker_row * cell_size + margin
         elif marker_row == game.size - 1 and marker_col == 0:
-            x = marker_col * CELL_SIZE + margin
-            y = marker_row * CELL_SIZE + CELL_SIZE - rect_size - margin
+            x = marker_col * cell_size + margin
+            y = marker_row * cell_size + cell_size - rect_size - margin
         elif marker_row == game.size - 1 and marker_col == game.size - 1:
-            x = marker_col * CELL_SIZE + CELL_SIZE - rect_size - margin
-            y = marker_row * CELL_SIZE + CELL_SIZE - rect_size - margin
+            x = marker_col * cell_size + cell_size - rect_size - margin
+            y = marker_row * cell_size + cell_size - rect_size - margin
         else:
-            x = marker_col * CELL_SIZE + CELL_SIZE - rect_size - margin
-            y = marker_row * CELL_SIZE + CELL_SIZE - rect_size - margin
+            x = marker_col * cell_size + cell_size - rect_size - margin
+            y = marker_row * cell_size + cell_size - rect_size - margin
         pygame.draw.rect(screen, RED, (x, y, rect_size, rect_size))
 
     pygame.display.flip()
 
-def run_v4():
+def run_v4(size=SIZE, win_line=WIN_LINE):
     pygame.init()
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption(f"[V4] Гравитация + поворот {SIZE}x{SIZE} (победа - {WIN_LINE} в ряд)")
+    pygame.display.set_caption(f"[V4] Гравитация + поворот {size}x{size} (победа - {win_line} в ряд)")
     clock = pygame.time.Clock()
-    game = GameV4(SIZE, WIN_LINE)
-    bot = Bot(game, max_depth=1)
-    img_x, img_o = load_images()
-    running = True
+    game = GameV4(size, win_line)
+    board_pixels = size * game.cell_size
+    screen = pygame.display.set_mode((board_pixels, board_pixels + INFO_PANEL_HEIGHT))
+    bot = make_window_bot(4, game)
+    thinker = BotThinker(bot)
+    img_x, img_o = load_images(game.cell_size)
 
     while not game.game_over:
         current_time = pygame.time.get_ticks()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                thinker.shutdown()
                 pygame.quit()
                 return 0
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and game.current_player == PLAYER_X:
                 pos = pygame.mouse.get_pos()
                 col = game.get_col_from_pos(pos)
                 if col is not None:
                     game.start_animation(col)
 
         if not game.game_over and game.current_player == PLAYER_O and not game.anim_active and not game.rotation_fall_active and not game.pre_fall_delay_active:
-            move = bot.get_best_move()
-            if move is not None:
+            if not thinker.is_thinking():
+                thinker.start(game)
+            done, move = thinker.poll()
+            if done and move is not None:
                 game.start_animation(move)
+        elif not game.game_over and not game.anim_active and not game.rotation_fall_active and not game.pre_fall_delay_active:
+            thinker.ponder(game)
 
         game.update_animation(current_time)
         draw_board_v4(screen, game, img_x, img_o)
         clock.tick(60)
 
+    thinker.shutdown()
     pygame.time.wait(1000)
     pygame.quit()
-    if game.winner == PLAYER_X or game.winner is None:
-        return 1
-    else:
-        return 0
+    return game_result(game)
 
 # ---------------------------------------------------------
 # Версия 5: случайное превращение X <-> O каждый 3-й ход
@@ -1185,6 +2001,7 @@ class GameV5:
     def __init__(self, size, win_line, deterministic=False):
         self.size = size
         self.win_line = win_line
+        self.cell_size = cell_size_for(size)
         self.deterministic = deterministic
         self.reset()
 
@@ -1194,6 +2011,7 @@ class GameV5:
         self.game_over = False
         self.winner = None
         self.moves_count = 0
+        self.near = _empty_near(self.size)
 
     def make_move(self, move):
         row, col = move
@@ -1205,6 +2023,7 @@ class GameV5:
             return False
 
         self.board[row][col] = self.current_player
+        _mark_near(self.near, self.size, row, col, 1)
         self.moves_count += 1
 
         if self.check_win(row, col):
@@ -1237,23 +2056,27 @@ class GameV5:
                 elif self.board[r][c] == PLAYER_O:
                     o_positions.append((r, c))
 
-        changed = False
-        if x_positions:
-            rx, cx = random.choice(x_positions)
-            self.board[rx][cx] = PLAYER_O
-            changed = True
-        if o_positions:
-            ro, co = random.choice(o_positions)
-            self.board[ro][co] = PLAYER_X
-            changed = True
-
-        if changed:
-            if self.check_win_any(PLAYER_X):
-                self.game_over = True
-                self.winner = PLAYER_X
-            elif self.check_win_any(PLAYER_O):
-                self.game_over = True
-                self.winner = PLAYER_O
+        x_pos = random.choice(x_positions) if x_positions else None
+        o_pos = random.choice(o_positions) if o_positions else None
+        self._flip(x_pos, o_pos)
+
+    def _flip(self, x_pos, o_pos):
+        # До превращения линий не было (иначе партия бы кончилась), поэтому
+        # новая линия X может пройти только через клетку, ставшую X, а линия
+        # O - через ставшую O: хватает двух проверок check_win вместо обхода
+        # всей доски. Как и раньше, победа X проверяется первой
+        if x_pos:
+            r, c = x_pos
+            self.board[r][c] = PLAYER_O
+        if o_pos:
+            r, c = o_pos
+            self.board[r][c] = PLAYER_X
+        if o_pos and self.check_win(*o_pos):
+            self.game_over = True
+            self.winner = PLAYER_X
+        elif x_pos and self.check_win(*x_pos):
+            self.game_over = True
+            self.winner = PLAYER_O
 
     def _transform_deterministic(self):
         x_pos = None
@@ -1264,22 +2087,7 @@ class GameV5:
                     x_pos = (r, c)
                 elif self.board[r][c] == PLAYER_O and o_pos is None:
                     o_pos = (r, c)
-        changed = False
-        if x_pos:
-            r, c = x_pos
-            self.board[r][c] = PLAYER_O
-            changed = True
-        if o_pos:
-            r, c = o_pos
-            self.board[r][c] = PLAYER_X
-            changed = True
-        if changed:
-            if self.check_win_any(PLAYER_X):
-                self.game_over = True
-                self.winner = PLAYER_X
-            elif self.check_win_any(PLAYER_O):
-                self.game_over = True
-                self.winner = PLAYER_O
+        self._flip(x_pos, o_pos)
 
     def check_win(self, row, col):
         player = self.board[row][col]
@@ -1312,10 +2120,10 @@ class GameV5:
 
     def get_cell_from_pos(self, pos):
         x, y = pos
-        if y >= WINDOW_HEIGHT - INFO_PANEL_HEIGHT:
+        if y >= self.size * self.cell_size:
             return None
-        col = x // CELL_SIZE
-        row = y // CELL_SIZE
+        col = x // self.cell_size
+        row = y // self.cell_size
         if 0 <= row < self.size and 0 <= col < self.size:
             return row, col
         return None
@@ -1328,6 +2136,19 @@ class GameV5:
                     moves.append((r, c))
         return moves
 
+    def candidate_cells(self):
+        return [(r, c) for r in range(self.size) for c in range(self.size)
+                if self.board[r][c] == EMPTY and self.near[r][c] > 0]
+
+    def wins_with(self, row, col, player):
+        self.board[row][col] = player
+        won = self.check_win(row, col)
+        self.board[row][col] = EMPTY
+        return won
+
+    def get_candidate_moves(self, player):
+        return candidate_moves(self, player)
+
     def copy(self):
         new = GameV5(self.size, self.win_line, self.deterministic)
         new.board = [row[:] for row in self.board]
@@ -1335,34 +2156,287 @@ class GameV5:
         new.game_over = self.game_over
         new.winner = self.winner
         new.moves_count = self.moves_count
+        new.near = [row[:] for row in self.near]
         return new
 
+# ---------------------------------------------------------
+# Бот Монте-Карло (MCTS) для версии 5 со случайными превращениями
+# ---------------------------------------------------------
+# Дерево "открытого цикла": узел хранит только последовательность ходов,
+# а позиция заново разыгрывается на каждой итерации настоящим
+# GameV5.make_move со случайным превращением. Занятость клеток от
+# превращений не меняется, поэтому ходы узла всегда допустимы.
+class _MCTSNode:
+    __slots__ = ('move', 'parent', 'player', 'children', 'untried', 'visits', 'score')
+
+    def __init__(self, move, parent, player, untried):
+        self.move = move
+        self.parent = parent
+        self.player = player      # игрок, сделавший ход move
+        self.children = []
+        self.untried = untried
+        self.visits = 0
+        self.score = 0.0
+
+class MCTSBot:
+    def __init__(self, game, player=PLAYER_O, time_limit=BOT_TIME_LIMIT, max_iterations=None,
+                 exploration=MCTS_EXPLORATION, rollout_batch=MCTS_ROLLOUT_BATCH, seed=None, book=None):
+        self.game = game
+        self.book = book
+        self.player = player
+        self.time_limit = time_limit
+        self.max_iterations = max_iterations
+        self.exploration = exploration
+        self.rollout_batch = rollout_batch
+        self.rng = random.Random(seed)
+        self.iterations = 0
+        self.nodes = 0            # итерации дерева за всё время (для замеров скорости)
+
+    def get_best_move(self, game=None, stop_event=None):
+        if game is None:
+            game = self.game
+        if game.game_over:
+            return None
+        if self.book is not None:
+            move = self.book.lookup(game)
+            if move is not None:
+                return move
+        opponent = PLAYER_X if game.current_player == PLAYER_O else PLAYER_O
+        root = _MCTSNode(None, None, opponent, self._node_moves(game))
+        if len(root.untried) == 1:
+            return root.untried[0]
+
+        deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        self.iterations = 0
+        while True:
+            if stop_event is not None and stop_event.is_set():
+                break
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            if self.max_iterations is not None and self.iterations >= self.max_iterations:
+                break
+            self._iterate(root, game)
+            self.iterations += 1
+            self.nodes += 1
+
+        if not root.children:
+            return root.untried[-1] if root.untried else None
+        return max(root.children, key=lambda node: node.visits).move
+
+    def close(self):
+        pass
+
+    def _node_moves(self, game):
+        # Вынужденные ходы, затем MCTS_MAX_CHILDREN самых перспективных клеток
+        # по окнам линий (untried расходуется с конца, поэтому список развёрнут)
+        player = game.current_player
+        forced, quiet = game.get_candidate_moves(player)
+        quiet.sort(key=lambda cell: -_cell_potential(game, cell[0], cell[1], player))
+        moves = forced + quiet[:MCTS_MAX_CHILDREN]
+        moves.reverse()
+        return moves
+
+    def _select_child(self, node):
+        log_visits = math.log(node.visits)
+        exploration = self.exploration
+        return max(node.children,
+                   key=lambda child: child.score / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+    def _iterate(self, root, game):
+        node = root
+        state = game.copy()
+        while not node.untried and node.children and not state.game_over:
+            node = self._select_child(node)
+            state.make_move(node.move)
+
+        if not state.game_over and node.untried:
+            move = node.untried.pop()
+            mover = state.current_player
+            state.make_move(move)
+            child = _MCTSNode(move, node, mover, [] if state.game_over else self._node_moves(state))
+            node.children.append(child)
+            node = child
+
+        rewards = self._rollouts(state)
+        batch = self.rollout_batch
+        while node is not None:
+            node.visits += batch
+            node.score += rewards[node.player]
+            node = node.parent
+
+    def _rollouts(self, state):
+        # Пачка случайных доигрываний из одной позиции на плоском массиве с рамкой
+        # из -1: шаги 1, width, width +/- 1 упираются в рамку вместо проверки границ
+        batch = self.rollout_batch
+        rewards = {PLAYER_X: 0.0, PLAYER_O: 0.0}
+        if state.game_over:
+            if state.winner is None:
+                rewards[PLAYER_X] = rewards[PLAYER_O] = 0.5 * batch
+            else:
+                rewards[state.winner] = float(batch)
+            return rewards
+
+        size = state.size
+        width = size + 1
+        win_line = state.win_line
+        steps = (1, width, width + 1, width - 1)
+        base = [-1] * ((size + 2) * width)
+        for r in range(size):
+            offset = (r + 1) * width
+            base[offset:offset + size] = state.board[r]
+        empties = []
+        cells = {PLAYER_X: [], PLAYER_O: []}
+        for i, value in enumerate(base):
+            if value == EMPTY:
+                empties.append(i)
+            elif value > 0:
+                cells[value].append(i)
+        threats = {player: [] for player in cells}
+        for player, stones in cells.items():
+            for i in stones:
+                _flat_threats(base, i, player, steps, win_line, threats[player])
+
+        for _ in range(batch):
+            winner = self._rollout(base[:], empties[:], cells[PLAYER_X][:], cells[PLAYER_O][:],
+                                   threats[PLAYER_X][:], threats[PLAYER_O][:],
+                                   state.current_player, state.moves_count, width, win_line)
+            if winner is None:
+                rewards[PLAYER_X] += 0.5
+                rewards[PLAYER_O] += 0.5
+            else:
+                rewards[winner] += 1.0
+        return rewards
+
+    def _rollout(self, board, empties, x_cells, o_cells, x_threats, o_threats,
+                 player, moves_count, width, win_line):
+        # Политика доигрывания: выиграть, если можно; иначе закрыть выигрыш
+        # соперника; иначе случайная клетка, по возможности рядом с фишками.
+        # threats - клетки, дополняющие окно до линии; проверяются при выборе,
+        # т.к. превращения могли их испортить
+        rng = self.rng
+        steps = (1, width, width + 1, width - 1)
+        neighbours = (1, -1, width, -width, width + 1, -width - 1, width - 1, -width + 1)
+        threats = {PLAYER_X: x_threats, PLAYER_O: o_threats}
+        while empties:
+            opponent = PLAYER_O if player == PLAYER_X else PLAYER_X
+            i = _flat_threat_move(board, threats[player], player, steps, win_line)
+            if i is None:
+                i = _flat_threat_move(board, threats[opponent], opponent, steps, win_line)
+            if i is not None:
+                empties.remove(i)
+            else:
+                for _ in range(MCTS_ROLLOUT_TRIES):
+                    k = rng.randrange(len(empties))
+                    i = empties[k]
+                    if any(board[i + d] > 0 for d in neighbours):
+                        break
+                empties[k] = empties[-1]
+                empties.pop()
+            board[i] = player
+            (x_cells if player == PLAYER_X else o_cells).append(i)
+            moves_count += 1
+            if _flat_wins_at(board, i, player, steps, win_line):
+                return player
+            if not empties:
+                return None
+            _flat_threats(board, i, player, steps, win_line, threats[player])
+            player = opponent
+
+            if moves_count % 3 == 0:
+                # то же превращение, что GameV5._transform_random: один X -> O, один O -> X;
+                # новая линия может пройти только через изменённые клетки
+                xi = x_cells.pop(rng.randrange(len(x_cells))) if x_cells else None
+                oi = o_cells.pop(rng.randrange(len(o_cells))) if o_cells else None
+                if xi is not None:
+                    board[xi] = PLAYER_O
+                    o_cells.append(xi)
+                if oi is not None:
+                    board[oi] = PLAYER_X
+                    x_cells.append(oi)
+                if oi is not None and _flat_wins_at(board, oi, PLAYER_X, steps, win_line):
+                    return PLAYER_X
+                if xi is not None and _flat_wins_at(board, xi, PLAYER_O, steps, win_line):
+                    return PLAYER_O
+                if oi is not None:
+                    _flat_threats(board, oi, PLAYER_X, steps, win_line, x_threats)
+                if xi is not None:
+                    _flat_threats(board, xi, PLAYER_O, steps, win_line, o_threats)
+        return None
+
+def _flat_threats(board, i, player, steps, win_line, out):
+    # Добавляет в out пустые клетки окон через i, где у player не хватает одной фишки
+    for step in steps:
+        lo = i
+        n = 0
+        while n < win_line - 1 and (board[lo - step] == player or board[lo - step] == EMPTY):
+            lo -= step
+            n += 1
+        hi = i
+        n = 0
+        while n < win_line - 1 and (board[hi + step] == player or board[hi + step] == EMPTY):
+            hi += step
+            n += 1
+        line = range(lo, hi + step, step)
+        for start in range(len(line) - win_line + 1):
+            gaps = [j for j in line[start:start + win_line] if board[j] == EMPTY]
+            if len(gaps) == 1:
+                out.append(gaps[0])
+
+def _flat_threat_move(board, threats, player, steps, win_line):
+    while threats:
+        i = threats.pop()
+        if board[i] != EMPTY:
+            continue
+        board[i] = player
+        won = _flat_wins_at(board, i, player, steps, win_line)
+        board[i] = EMPTY
+        if won:
+            return i
+    return None
+
+def _flat_wins_at(board, i, player, steps, win_line):
+    for step in steps:
+        count = 1
+        j = i + step
+        while board[j] == player:
+            count += 1
+            j += step
+        j = i - step
+        while board[j] == player:
+            count += 1
+            j -= step
+        if count >= win_line:
+            return True
+    return False
+
 def draw_board_v5(screen, game, img_x, img_o):
+    cell_size = game.cell_size
     screen.fill(WHITE)
     for i in range(game.size + 1):
-        pygame.draw.line(screen, BLACK, (0, i * CELL_SIZE), (game.size * CELL_SIZE, i * CELL_SIZE), 2)
-        pygame.draw.line(screen, BLACK, (i * CELL_SIZE, 0), (i * CELL_SIZE, game.size * CELL_SIZE), 2)
+        pygame.draw.line(screen, BLACK, (0, i * cell_size), (game.size * cell_size, i * cell_size), 2)
+        pygame.draw.line(screen, BLACK, (i * cell_size, 0), (i * cell_size, game.size * cell_size), 2)
 
     for row in range(game.size):
         for col in range(game.size):
             if game.board[row][col] == PLAYER_X:
                 if img_x:
-                    screen.blit(img_x, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_x, (col * cell_size, row * cell_size))
                 else:
-                    margin = 10
-                    start_pos = (col * CELL_SIZE + margin, row * CELL_SIZE + margin)
-                    end_pos = ((col + 1) * CELL_SIZE - margin, (row + 1) * CELL_SIZE - margin)
+                    margin = cell_size // 5
+                    start_pos = (col * cell_size + margin, row * cell_size + margin)
+                    end_pos = ((col + 1) * cell_size - margin, (row + 1) * cell_size - margin)
                     pygame.draw.line(screen, RED, start_pos, end_pos, 3)
                     pygame.draw.line(screen, RED, (end_pos[0], start_pos[1]), (start_pos[0], end_pos[1]), 3)
             elif game.board[row][col] == PLAYER_O:
                 if img_o:
-                    screen.blit(img_o, (col * CELL_SIZE, row * CELL_SIZE))
+                    screen.blit(img_o, (col * cell_size, row * cell_size))
                 else:
-                    center = (col * CELL_SIZE + CELL_SIZE // 2, row * CELL_SIZE + CELL_SIZE // 2)
-                    radius = CELL_SIZE // 2 - 10
+                    center = (col * cell_size + cell_size // 2, row * cell_size + cell_size // 2)
+                    radius = cell_size // 2 - cell_size // 5
                     pygame.draw.circle(screen, BLUE, center, radius, 3)
 
-    panel_rect = pygame.Rect(0, game.size * CELL_SIZE, WINDOW_WIDTH, INFO_PANEL_HEIGHT)
+    panel_rect = pygame.Rect(0, game.size * cell_size, game.size * cell_size, INFO_PANEL_HEIGHT)
     pygame.draw.rect(screen, GRAY, panel_rect)
     font = pygame.font.Font(None, 36)
 
@@ -1375,26 +2449,30 @@ def draw_board_v5(screen, game, img_x, img_o):
         text = f"Ходит {PLAYER_SYMBOL[game.current_player]}"
 
     text_surface = font.render(text, True, BLACK)
-    text_rect = text_surface.get_rect(center=(WINDOW_WIDTH // 2, game.size * CELL_SIZE + INFO_PANEL_HEIGHT // 2))
+    text_rect = text_surface.get_rect(center=(game.size * cell_size // 2, game.size * cell_size + INFO_PANEL_HEIGHT // 2))
     screen.blit(text_surface, text_rect)
     pygame.display.flip()
 
-def run_v5():
+def run_v5(size=SIZE, win_line=WIN_LINE):
     pygame.init()
-    screen = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
-    pygame.display.set_caption(f"[V5] Превращение {SIZE}x{SIZE} (победа - {WIN_LINE} в ряд)")
+    pygame.display.set_caption(f"[V5] Превращение {size}x{size} (победа - {win_line} в ряд)")
     clock = pygame.time.Clock()
-    game = GameV5(SIZE, WIN_LINE, deterministic=False)
-    bot = Bot(GameV5(SIZE, WIN_LINE, deterministic=True), max_depth=1)
-    img_x, img_o = load_images()
-    running = True
+    game = GameV5(size, win_line, deterministic=False)
+    board_pixels = size * game.cell_size
+    screen = pygame.display.set_mode((board_pixels, board_pixels + INFO_PANEL_HEIGHT))
+    bot = make_window_bot(5, game)
+    # заранее не думает: после случайного превращения X<->O заготовленная
+    # позиция почти никогда не встречается
+    thinker = BotThinker(bot, ponder_replies=0)
+    img_x, img_o = load_images(game.cell_size)
 
     while not game.game_over:
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                thinker.shutdown()
                 pygame.quit()
                 return 0
-            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1 and game.current_player == PLAYER_X:
                 pos = pygame.mouse.get_pos()
                 cell = game.get_cell_from_pos(pos)
                 if cell is not None:
@@ -1402,36 +2480,272 @@ def run_v5():
                     game.make_move((row, col))
 
         if not game.game_over and game.current_player == PLAYER_O:
-            temp_game = game.copy()
-            temp_game.deterministic = True
-            bot.game = temp_game
-            move = bot.get_best_move()
-            if move is not None:
+            if not thinker.is_thinking():
+                thinker.start(game)
+            done, move = thinker.poll()
+            if done and move is not None:
                 game.make_move(move)
+        elif not game.game_over:
+            thinker.ponder(game)
 
         draw_board_v5(screen, game, img_x, img_o)
         clock.tick(30)
 
+    thinker.shutdown()
     pygame.time.wait(1000)
     pygame.quit()
+    return game_result(game)
+
+# ==================== СИММЕТРИИ ПОЗИЦИЙ ====================
+# Симметрия квадрата задаётся номером 0..7 из трёх битов, которые
+# применяются по порядку: 4 - транспонирование, 2 - отражение строк
+# (верх-низ), 1 - отражение столбцов (лево-право). Вариант допускает
+# только те симметрии, которые не меняют его правил.
+TT_EXACT = 0
+TT_LOWER = 1
+TT_UPPER = 2
+
+def rule_symmetries(game):
+    if isinstance(game, GameV1):
+        # падение вниз не меняется при отражении слева направо
+        return (0, 1)
+    if isinstance(game, GameV5) and not game.deterministic:
+        # случайное превращение симметрично; детерминированное берёт
+        # первую по строкам фишку и симметрию ломает
+        return tuple(range(8))
+    # Поворот GameV4 по часовой стрелке при отражении стал бы обратным.
+    # У GameV2/GameV3 сдвиг идёт по нечётным столбцам/строкам в заданную
+    # сторону, а при одновременной победе обоих после сдвига выигрывает
+    # линия, чья клетка раньше по строкам, - любое отражение это меняет
+    return (0,)
+
+def transform_cell(symmetry, row, col, size):
+    if symmetry & 4:
+        row, col = col, row
+    if symmetry & 2:
+        row = size - 1 - row
+    if symmetry & 1:
+        col = size - 1 - col
+    return row, col
+
+def untransform_cell(symmetry, row, col, size):
+    if symmetry & 1:
+        col = size - 1 - col
+    if symmetry & 2:
+        row = size - 1 - row
+    if symmetry & 4:
+        row, col = col, row
+    return row, col
+
+def transform_move(game, symmetry, move):
+    if isinstance(move, int):
+        # ход-столбец: у вариантов с падением допустимо только отражение
+        return game.size - 1 - move if symmetry & 1 else move
+    return transform_cell(symmetry, move[0], move[1], game.size)
+
+def untransform_move(game, symmetry, move):
+    if isinstance(move, int):
+        return game.size - 1 - move if symmetry & 1 else move
+    return untransform_cell(symmetry, move[0], move[1], game.size)
+
+def _symmetric_rows(board, symmetry):
+    rows = list(zip(*board)) if symmetry & 4 else board
+    if symmetry & 2:
+        rows = rows[::-1]
+    if symmetry & 1:
+        rows = [row[::-1] for row in rows]
+    return rows
+
+def position_key(game, symmetry=0):
+    # Устойчивый между процессами 64-битный хэш позиции, отображённой
+    # симметрией, вместе с правилами, от которых зависит продолжение
+    # (чья очередь, фаза сдвигов/поворотов)
+    state = (type(game).__name__, game.size, game.win_line, game.current_player,
+             game.moves_count % 3, getattr(game, 'shift_parity', 0), getattr(game, 'shift_direction', 0))
+    digest = hashlib.blake2b(repr(state).encode(), digest_size=8)
+    digest.update(bytes(value for row in _symmetric_rows(game.board, symmetry) for value in row))
+    return int.from_bytes(digest.digest(), "little")
+
+def canonical_key(game):
+    # Наименьший ключ среди симметричных образов и симметрия, которая к
+    # нему переводит: ход в позиции game переводится transform_move
+    return min((position_key(game, symmetry), symmetry) for symmetry in rule_symmetries(game))
+
+def _rule_state(game):
+    return (game.current_player, game.moves_count % 3,
+            getattr(game, 'shift_parity', 0), getattr(game, 'shift_direction', 0))
+
+def search_key(game):
+    # Ключ таблицы транспозиций внутри поиска - как canonical_key, но без
+    # хэша: кортеж из состояния правил и доски (у битовых досок - биты
+    # игроков). Вариант, размер и длина линии в ключ не входят - их
+    # сверяет Bot._search_root. Перебор образов - только там, где правила
+    # допускают симметрии (GameV1, случайный GameV5)
+    symmetries = rule_symmetries(game)
+    bits = getattr(game, 'bits', None)
+    if len(symmetries) == 1:
+        if bits is not None:
+            return (_rule_state(game), bits[PLAYER_X], bits[PLAYER_O]), 0
+        return (_rule_state(game), tuple(map(tuple, game.board))), 0
+    state = _rule_state(game)
+    return min(((state, tuple(map(tuple, _symmetric_rows(game.board, symmetry)))), symmetry)
+               for symmetry in symmetries)
+
+# ==================== ДЕБЮТНАЯ КНИГА ====================
+# Заранее посчитанные ходы для первых позиций партии (строит
+# cross_zero_book.py). Файл: заголовок BOOK_MAGIC + число записей, затем
+# отсортированные 64-битные канонические ключи позиций и 16-битные ходы
+# в канонической позиции (клетка row * size + col или номер столбца).
+# Поиск - двоичный по ключам.
+BOOK_MAGIC = b"CZB2"
+
+def book_entry(game, move):
+    # Запись книги для хода move в позиции game
+    key, symmetry = canonical_key(game)
+    return key, encode_move(game, transform_move(game, symmetry, move))
+
+def encode_move(game, move):
+    if isinstance(move, int):
+        return move
+    return move[0] * game.size + move[1]
+
+def decode_move(game, code):
+    if isinstance(game, (GameV1, GameV4)):
+        return code
+    return divmod(code, game.size)
+
+class OpeningBook:
+    def __init__(self, entries=()):
+        entries = sorted(entries)
+        self.keys = array('Q', [key for key, _ in entries])
+        self.moves = array('H', [move for _, move in entries])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, game):
+        # Ход из книги или None; ход проверяется на допустимость
+        if not self.keys or game.game_over:
+            return None
+        key, symmetry = canonical_key(game)
+        i = bisect_left(self.keys, key)
+        if i == len(self.keys) or self.keys[i] != key:
+            return None
+        move = untransform_move(game, symmetry, decode_move(game, self.moves[i]))
+        if move not in game.get_possible_moves(game.current_player):
+            return None
+        return move
+
+    def save(self, path):
+        keys = array('Q', self.keys)
+        moves = array('H', self.moves)
+        if sys.byteorder == "big":
+            keys.byteswap()
+            moves.byteswap()
+        with open(path, "wb") as f:
+            f.write(BOOK_MAGIC + struct.pack("<I", len(keys)))
+            f.write(keys.tobytes())
+            f.write(moves.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        book = cls()
+        with open(path, "rb") as f:
+            if f.read(4) != BOOK_MAGIC:
+                raise ValueError(f"{path}: это не дебютная книга")
+            (count,) = struct.unpack("<I", f.read(4))
+            book.keys.frombytes(f.read(8 * count))
+            book.moves.frombytes(f.read(2 * count))
+        if sys.byteorder == "big":
+            book.keys.byteswap()
+            book.moves.byteswap()
+        return book
+
+    @classmethod
+    def load_version(cls, version):
+        # Книга для варианта из BOOK_DIR или None, если её ещё не строили
+        path = book_path(version)
+        if not os.path.exists(path):
+            return None
+        try:
+            return cls.load(path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f"Ошибка загрузки дебютной книги: {e}")
+            return None
+
+def book_path(version):
+    return os.path.join(BOOK_DIR, f"cross_zero_v{version}.bin")
+
+# ==================== ИГРА БЕЗ ОКНА ====================
+# Партия целиком без pygame: ходы берутся у "поставщиков" - функций,
+# которые получают игру (и не меняют её) и возвращают ход, например
+# bot.get_best_move. Анимации и паузы пропускаются, sys.exit не вызывается.
+GAME_VERSIONS = {1: GameV1, 2: GameV2, 3: GameV3, 4: GameV4, 5: GameV5}
+
+def make_window_bot(version, game, workers=BOT_WORKERS):
+    # Бот, который играет за O в окне run_v<version>
+    book = OpeningBook.load_version(version)
+    if version == 5:
+        return MCTSBot(game, time_limit=BOT_TIME_LIMIT, book=book)
+    max_depth = 4 if version in (1, 4) else 3
+    return Bot(game, max_depth=max_depth, time_limit=BOT_TIME_LIMIT, workers=workers, book=book)
+
+def game_result(game):
+    # 1, если победил X или ничья, иначе 0 - как возвращают run_v1..run_v5
     if game.winner == PLAYER_X or game.winner is None:
         return 1
-    else:
-        return 0
+    return 0
+
+def scripted_player(moves):
+    moves = iter(moves)
+
+    def provide(game):
+        return next(moves, None)
+    return provide
+
+def random_player(seed=None):
+    rng = random.Random(seed)
+
+    def provide(game):
+        moves = game.get_possible_moves(game.current_player)
+        return rng.choice(moves) if moves else None
+    return provide
+
+def run_headless(version, x_player, o_player, size=SIZE, win_line=WIN_LINE):
+    # Играет вариант до конца и возвращает законченную игру. Если поставщик
+    # не дал хода или дал недопустимый, партия останавливается как есть
+    game = GAME_VERSIONS[version](size, win_line)
+    players = {PLAYER_X: x_player, PLAYER_O: o_player}
+    while not game.game_over:
+        move = players[game.current_player](game)
+        if move is None or not game.make_move(move):
+            break
+    return game
+
+def cross_zero_headless(x_player, o_player=None, version=None, size=SIZE, win_line=WIN_LINE):
+    # То же, что cross_zero(), но без окна: O по умолчанию - оконный бот
+    if version is None:
+        version = random.randint(1, 5)
+    if o_player is None:
+        bot = make_window_bot(version, None, workers=1)
+        o_player = bot.get_best_move
+    return game_result(run_headless(version, x_player, o_player, size, win_line))
 
 # ==================== ГЛАВНЫЙ БЛОК ВЫБОРА ВЕРСИИ ====================
-def cross_zero():
+# Размер доски можно задать при вызове (например, 15 или 19): клетка
+# берётся из BOARD_PIXELS, а время ответа бота ограничено BOT_TIME_LIMIT
+def cross_zero(size=SIZE, win_line=WIN_LINE):
     version = random.randint(1, 5)
     result = 0
     if version == 1:
-        result = run_v1()
+        result = run_v1(size, win_line)
     elif version == 2:
-        result = run_v2()
+        result = run_v2(size, win_line)
     elif version == 3:
-        result = run_v3()
+        result = run_v3(size, win_line)
     elif version == 4:
-        result = run_v4()
+        result = run_v4(size, win_line)
     else:
-        result = run_v5()
+        result = run_v5(size, win_line)
     sys.exit(result)
     return result
@@ -0,0 +1,193 @@
+import os
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import itertools
+import json
+import math
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from cross_zero_library import (
+    SIZE, WIN_LINE, PLAYER_X, PLAYER_O, GAME_VERSIONS, Bot, MCTSBot, run_headless,
+)
+
+# ---------------------------------------------------------
+# Турнир ботов между собой без окна: все пары конфигураций играют
+# обоими цветами во всех пяти вариантах, партии идут в процессах.
+# Запуск: python cross_zero_tournament.py --games 2 --out results.jsonl
+# ---------------------------------------------------------
+
+# Конфигурации ботов: "kind" - класс, остальное - аргументы конструктора
+BOT_CONFIGS = {
+    'depth1': {'kind': 'minimax', 'max_depth': 1},
+    'depth2': {'kind': 'minimax', 'max_depth': 2, 'time_limit': 1.0},
+    'depth3': {'kind': 'minimax', 'max_depth': 3, 'time_limit': 1.0},
+    'mcts': {'kind': 'mcts', 'time_limit': 1.0},
+}
+
+ELO_BASE = 1500
+ELO_ITERATIONS = 10000    # предел шагов подбора рейтингов
+ELO_TOLERANCE = 0.001     # подбор останавливается, когда шаг меньше этого (в пунктах)
+ELO_PRIOR_DRAWS = 1       # виртуальных ничьих каждого бота со средним соперником
+
+def make_bot(config, game, player, seed):
+    params = dict(config)
+    kind = params.pop('kind')
+    if kind == 'mcts':
+        return MCTSBot(game, player=player, seed=seed, **params)
+    return Bot(game, player=player, **params)
+
+def timed_player(bot, variant, stats):
+    # Поставщик хода для run_headless, который копит время и число ходов
+    def provide(game):
+        search_game = game
+        if variant == 5 and isinstance(bot, Bot):
+            # минимаксу, как и раньше в run_v5, нужны детерминированные правила
+            search_game = game.copy()
+            search_game.deterministic = True
+        start = time.perf_counter()
+        move = bot.get_best_move(search_game)
+        stats['time'] += time.perf_counter() - start
+        stats['moves'] += 1
+        return move
+    return provide
+
+def play_game(variant, x_name, o_name, seed, size=SIZE, win_line=WIN_LINE):
+    # Одна партия; возвращает запись для журнала турнира
+    random.seed(seed)
+    bots = {
+        'x': make_bot(BOT_CONFIGS[x_name], None, PLAYER_X, seed),
+        'o': make_bot(BOT_CONFIGS[o_name], None, PLAYER_O, seed),
+    }
+    stats = {side: {'time': 0.0, 'moves': 0} for side in bots}
+    game = run_headless(variant,
+                        timed_player(bots['x'], variant, stats['x']),
+                        timed_player(bots['o'], variant, stats['o']),
+                        size, win_line)
+    return {
+        'variant': variant,
+        'size': size,
+        'x': x_name,
+        'o': o_name,
+        'seed': seed,
+        'winner': {PLAYER_X: 'x', PLAYER_O: 'o'}.get(game.winner),
+        'moves': game.moves_count,
+        'x_time': stats['x']['time'],
+        'o_time': stats['o']['time'],
+        'x_moves': stats['x']['moves'],
+        'o_moves': stats['o']['moves'],
+        'x_nodes': bots['x'].nodes,
+        'o_nodes': bots['o'].nodes,
+    }
+
+def schedule(names, variants, games):
+    # Каждая упорядоченная пара играет games партий в каждом варианте
+    seed = 0
+    for x_name, o_name in itertools.permutations(names, 2):
+        for variant in variants:
+            for _ in range(games):
+                yield variant, x_name, o_name, seed
+                seed += 1
+
+def run_tournament(names, variants, games, workers, out_path=None, size=SIZE, win_line=WIN_LINE):
+    jobs = list(schedule(names, variants, games))
+    results = []
+    out = open(out_path, "w", encoding="utf-8") if out_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            play = partial(play_game, size=size, win_line=win_line)
+            for result in pool.map(play, *zip(*jobs)):
+                results.append(result)
+                if out is not None:
+                    out.write(json.dumps(result) + "\n")
+    finally:
+        if out is not None:
+            out.close()
+    return results
+
+def game_score(result, side):
+    # Очки стороны side ('x' или 'o'): 1 - победа, 0.5 - ничья, 0 - поражение
+    if result['winner'] is None:
+        return 0.5
+    return 1.0 if result['winner'] == side else 0.0
+
+def compute_elo(results, names):
+    # Рейтинги максимального правдоподобия по модели Эло (ничья - пол-очка),
+    # подобранные градиентным подъёмом; средний рейтинг равен ELO_BASE.
+    # Без виртуальных ничьих со средним соперником у бота со 100% (или 0%)
+    # очков оптимума нет - рейтинг рос бы с числом шагов
+    ratings = {name: 0.0 for name in names}
+    if not results:
+        return {name: float(ELO_BASE) for name in names}
+    for _ in range(ELO_ITERATIONS):
+        gradient = {}
+        counts = {}
+        for name in names:
+            # рейтинги отцентрованы: средний соперник - 0
+            expected = 1.0 / (1.0 + 10 ** (-ratings[name] / 400))
+            gradient[name] = ELO_PRIOR_DRAWS * (0.5 - expected)
+            counts[name] = ELO_PRIOR_DRAWS
+        for result in results:
+            x, o = result['x'], result['o']
+            expected = 1.0 / (1.0 + 10 ** ((ratings[o] - ratings[x]) / 400))
+            delta = game_score(result, 'x') - expected
+            gradient[x] += delta
+            gradient[o] -= delta
+            counts[x] += 1
+            counts[o] += 1
+        updated = {name: ratings[name] + (32 * gradient[name] / math.sqrt(counts[name]) if counts[name] else 0.0)
+                   for name in names}
+        mean = sum(updated.values()) / len(updated)
+        updated = {name: rating - mean for name, rating in updated.items()}
+        largest_step = max(abs(updated[name] - ratings[name]) for name in names)
+        ratings = updated
+        if largest_step < ELO_TOLERANCE:
+            break
+    return {name: ELO_BASE + rating for name, rating in ratings.items()}
+
+def summarize(results, names):
+    stats = {name: {'games': 0, 'score': 0.0, 'wins': 0, 'draws': 0, 'time': 0.0,
+                    'moves': 0, 'nodes': 0} for name in names}
+    for result in results:
+        for side in ('x', 'o'):
+            entry = stats[result[side]]
+            score = game_score(result, side)
+            entry['games'] += 1
+            entry['score'] += score
+            entry['wins'] += score == 1.0
+            entry['draws'] += score == 0.5
+            entry['time'] += result[f'{side}_time']
+            entry['moves'] += result[f'{side}_moves']
+            entry['nodes'] += result[f'{side}_nodes']
+    elo = compute_elo(results, names)
+    for name in sorted(names, key=lambda n: -elo[n]):
+        entry = stats[name]
+        latency = entry['time'] / entry['moves'] * 1000 if entry['moves'] else 0.0
+        speed = entry['nodes'] / entry['time'] if entry['time'] else 0.0
+        print(f"{name:>10}  Эло {elo[name]:7.1f}  партий {entry['games']:4d}  "
+              f"побед {entry['wins']:4d}  ничьих {entry['draws']:3d}  "
+              f"очки {entry['score']:6.1f}  ход {latency:7.1f} мс  узлов/с {speed:9.0f}")
+    return stats, elo
+
+def main():
+    parser = argparse.ArgumentParser(description="Турнир ботов крестиков-ноликов")
+    parser.add_argument("--bots", nargs="+", default=list(BOT_CONFIGS), choices=list(BOT_CONFIGS))
+    parser.add_argument("--variants", nargs="+", type=int, default=list(GAME_VERSIONS), choices=list(GAME_VERSIONS))
+    parser.add_argument("--games", type=int, default=1, help="партий на пару, цвет и вариант")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--out", help="файл JSON Lines с результатами партий")
+    parser.add_argument("--size", type=int, default=SIZE, help="размер доски")
+    parser.add_argument("--win-line", type=int, default=WIN_LINE, help="длина выигрышной линии")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = run_tournament(args.bots, args.variants, args.games, args.workers, args.out,
+                             args.size, args.win_line)
+    print(f"Сыграно партий: {len(results)} за {time.perf_counter() - start:.1f} с")
+    summarize(results, args.bots)
+
+if __name__ == "__main__":
+    main()
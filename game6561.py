@@ -0,0 +1,499 @@
+import random
+import struct
+import sys
+from array import array
+
+# ---------------------------------------------------------
+# Упакованная доска 4x4 для игры 6561
+# ---------------------------------------------------------
+# Клетка - 4 бита со степенью тройки (0 - пусто, e - плитка 3 ** e),
+# строка - 16 бит, вся доска - одно 64-битное число. Клетка (r, c)
+# лежит в полубайте 4 * r + c, то есть строка r - биты 16 * r .. 16 * r + 15,
+# столбец 0 - младший полубайт строки.
+# Ход - четыре обращения к таблицам строк (для вертикальных ходов доска
+# транспонируется до и после).
+BOARD_SIZE = 4
+ROW_MASK = 0xFFFF
+MAX_EXPONENT = 15         # плитки 3 ** 15 уже не сливаются - для них нет полубайта
+WIN_EXPONENT = 8          # 3 ** 8 = 6561 - победа
+
+LEFT = 0
+RIGHT = 1
+UP = 2
+DOWN = 3
+DIRECTIONS = (LEFT, RIGHT, UP, DOWN)
+
+def _row_cells(row):
+    return [(row >> (4 * i)) & 0xF for i in range(BOARD_SIZE)]
+
+def _cells_row(cells):
+    row = 0
+    for i, exponent in enumerate(cells):
+        row |= exponent << (4 * i)
+    return row
+
+def _slide_left(cells):
+    # Те же правила, что compress/merge/compress в исходной игре: фишки
+    # сдвигаются к началу, равные соседи сливаются в одну (x3) слева направо
+    tiles = [e for e in cells if e]
+    result = []
+    score = 0
+    i = 0
+    while i < len(tiles):
+        if i + 1 < len(tiles) and tiles[i] == tiles[i + 1] and tiles[i] < MAX_EXPONENT:
+            result.append(tiles[i] + 1)
+            score += 3 ** (tiles[i] + 1)
+            i += 2
+        else:
+            result.append(tiles[i])
+            i += 1
+    return result + [0] * (BOARD_SIZE - len(result)), score
+
+def _reverse_row(row):
+    return _cells_row(_row_cells(row)[::-1])
+
+def _build_tables():
+    left = array('H', bytes(2 * 65536))
+    right = array('H', bytes(2 * 65536))
+    left_score = array('L', bytes(array('L').itemsize * 65536))
+    right_score = array('L', bytes(array('L').itemsize * 65536))
+    for row in range(65536):
+        cells, score = _slide_left(_row_cells(row))
+        left[row] = _cells_row(cells)
+        left_score[row] = score
+    for row in range(65536):
+        reversed_row = _reverse_row(row)
+        right[row] = _reverse_row(left[reversed_row])
+        right_score[row] = left_score[reversed_row]
+    return left, right, left_score, right_score
+
+ROW_LEFT, ROW_RIGHT, ROW_LEFT_SCORE, ROW_RIGHT_SCORE = _build_tables()
+
+def transpose(board):
+    # Транспонирование 4x4 полубайтов тремя масками и сдвигами
+    a1 = board & 0xF0F00F0FF0F00F0F
+    a2 = board & 0x0000F0F00000F0F0
+    a3 = board & 0x0F0F00000F0F0000
+    a = a1 | (a2 << 12) | (a3 >> 12)
+    b1 = a & 0xFF00FF0000FF00FF
+    b2 = a & 0x00FF00FF00000000
+    b3 = a & 0x00000000FF00FF00
+    return b1 | (b2 >> 24) | (b3 << 24)
+
+def _move_rows(board, table, score_table):
+    result = 0
+    score = 0
+    for shift in (0, 16, 32, 48):
+        row = (board >> shift) & ROW_MASK
+        result |= table[row] << shift
+        score += score_table[row]
+    return result, score
+
+def move(board, direction):
+    # (новая доска, очки за слияния); если ход ничего не меняет,
+    # новая доска равна прежней
+    if direction == LEFT:
+        return _move_rows(board, ROW_LEFT, ROW_LEFT_SCORE)
+    if direction == RIGHT:
+        return _move_rows(board, ROW_RIGHT, ROW_RIGHT_SCORE)
+    if direction == UP:
+        result, score = _move_rows(transpose(board), ROW_LEFT, ROW_LEFT_SCORE)
+    else:
+        result, score = _move_rows(transpose(board), ROW_RIGHT, ROW_RIGHT_SCORE)
+    return transpose(result), score
+
+def get_exponent(board, row, col):
+    return (board >> (4 * (BOARD_SIZE * row + col))) & 0xF
+
+def set_exponent(board, row, col, exponent):
+    shift = 4 * (BOARD_SIZE * row + col)
+    return (board & ~(0xF << shift)) | (exponent << shift)
+
+def exponent_of(value):
+    exponent = 0
+    while value > 1:
+        value //= 3
+        exponent += 1
+    return exponent
+
+def pack(values):
+    # Доска из списка строк с обычными значениями (0, 3, 9, ...)
+    board = 0
+    for row in range(BOARD_SIZE):
+        for col in range(BOARD_SIZE):
+            if values[row][col]:
+                board = set_exponent(board, row, col, exponent_of(values[row][col]))
+    return board
+
+def unpack(board):
+    values = []
+    for row in range(BOARD_SIZE):
+        cells = _row_cells((board >> (16 * row)) & ROW_MASK)
+        values.append([3 ** e if e else 0 for e in cells])
+    return values
+
+def empty_cells(board):
+    # Пустые клетки в порядке обхода строк, как в add_new_tile
+    return [(i // BOARD_SIZE, i % BOARD_SIZE) for i in range(BOARD_SIZE * BOARD_SIZE)
+            if not (board >> (4 * i)) & 0xF]
+
+def max_exponent(board):
+    best = 0
+    while board:
+        best = max(best, board & 0xF)
+        board >>= 4
+    return best
+
+def can_move(board):
+    return any(move(board, direction)[0] != board for direction in DIRECTIONS)
+
+# ---------------------------------------------------------
+# Маски клеток: бит 4 * i установлен, если клетка i подходит. Считаются
+# несколькими сдвигами всего числа, без обхода клеток.
+# ---------------------------------------------------------
+NIBBLE_LOW = 0x1111111111111111
+PAIR_RIGHT = 0x0111011101110111   # клетки, у которых есть сосед справа
+PAIR_DOWN = 0x0000111111111111    # клетки, у которых есть сосед снизу
+
+def _zero_nibbles(value):
+    value |= value >> 1
+    value |= value >> 2
+    return ~value & NIBBLE_LOW
+
+def empty_mask(board):
+    return _zero_nibbles(board)
+
+def has_merge(board):
+    # Есть ли соседние равные плитки (кроме 3 ** 15, которые не сливаются)
+    pairs = (_zero_nibbles(board ^ (board >> 4)) & PAIR_RIGHT
+             | _zero_nibbles(board ^ (board >> 16)) & PAIR_DOWN)
+    top = board & (board >> 1) & (board >> 2) & (board >> 3) & NIBBLE_LOW
+    return bool(pairs & ~_zero_nibbles(board) & ~top)
+
+def nth_cell(mask, n):
+    # Номер клетки n-го (с нуля, в порядке обхода строк) установленного бита маски
+    for _ in range(n):
+        mask &= mask - 1
+    return ((mask & -mask).bit_length() - 1) // 4
+
+# ---------------------------------------------------------
+# Пути плиток за ход - для анимации в окне. Для каждой плитки:
+# (откуда row, col, куда row, col, степень, сливается ли); неподвижные
+# плитки тоже входят, с совпадающими клетками.
+# ---------------------------------------------------------
+def line_cells(size, direction, index):
+    # Клетки линии index в порядке сдвига: первая - та, к которой едут плитки
+    if direction == LEFT:
+        return [(index, col) for col in range(size)]
+    if direction == RIGHT:
+        return [(index, col) for col in range(size - 1, -1, -1)]
+    if direction == UP:
+        return [(row, index) for row in range(size)]
+    return [(row, index) for row in range(size - 1, -1, -1)]
+
+def tile_movements(exponent_at, size, direction, merge_limit=MAX_EXPONENT):
+    # exponent_at(row, col) - степень в клетке доски до хода; правила как в
+    # _slide_left (merge_limit - степень, которая уже не сливается, None - нет)
+    movements = []
+    for index in range(size):
+        cells = line_cells(size, direction, index)
+        tiles = [(cell, exponent_at(*cell)) for cell in cells]
+        tiles = [(cell, exponent) for cell, exponent in tiles if exponent]
+        target = 0
+        i = 0
+        while i < len(tiles):
+            (row, col), exponent = tiles[i]
+            to_row, to_col = cells[target]
+            if (i + 1 < len(tiles) and tiles[i + 1][1] == exponent
+                    and (merge_limit is None or exponent < merge_limit)):
+                (next_row, next_col), _ = tiles[i + 1]
+                movements.append((row, col, to_row, to_col, exponent, True))
+                movements.append((next_row, next_col, to_row, to_col, exponent, True))
+                i += 2
+            else:
+                movements.append((row, col, to_row, to_col, exponent, False))
+                i += 1
+            target += 1
+    return movements
+
+# ---------------------------------------------------------
+# История партии: ход - 16-битный код (направление, клетка и степень
+# появившейся плитки), раз в HISTORY_CHECKPOINT_EVERY ходов - снимок
+# позиции. Отмена восстанавливает позицию от ближайшего снимка повтором
+# ходов и держит посчитанные позиции, поэтому отмены подряд стоят O(1).
+# Файл: HISTORY_MAGIC, размер доски, начальный счёт, число ходов,
+# степени клеток начальной доски по байту, затем коды ходов.
+# ---------------------------------------------------------
+HISTORY_CHECKPOINT_EVERY = 64
+HISTORY_MAGIC = b"6561"
+
+def encode_history_move(direction, spawned, size):
+    # (MoveHistory.record пишет тот же код без вызова функции)
+    # код: биты 0-1 - направление, 2-3 - степень плитки (0 - не появилась),
+    # с 4-го - номер клетки row * size + col (до 16x16)
+    if spawned is None:
+        return direction
+    row, col, exponent = spawned
+    return direction | exponent << 2 | (row * size + col) << 4
+
+def decode_history_move(code, size):
+    exponent = (code >> 2) & 3
+    if not exponent:
+        return code & 3, None
+    row, col = divmod(code >> 4, size)
+    return code & 3, (row, col, exponent)
+
+class MoveHistory:
+    def __init__(self, size, start):
+        self.size = size
+        self.start = start            # снимок game.snapshot() до первого хода
+        self.moves = array('H')
+        self.checkpoints = [start]    # снимок после каждых HISTORY_CHECKPOINT_EVERY ходов
+        self._undo_base = 0           # позиции _undo_base, _undo_base + 1, ... для отмен подряд
+        self._undo_states = []
+
+    def __len__(self):
+        return len(self.moves)
+
+    def record(self, game, direction, spawned):
+        moves = self.moves
+        if spawned is None:
+            moves.append(direction)
+        else:
+            row, col, exponent = spawned
+            moves.append(direction | exponent << 2 | (row * self.size + col) << 4)
+        if len(moves) % HISTORY_CHECKPOINT_EVERY == 0:
+            self.checkpoints.append(game.snapshot())
+
+    def replay(self, game, start=0, stop=None):
+        # Ходы start..stop-1 на game, стоящей в позиции start, без
+        # случайностей; после каждого хода отдаёт game
+        for code in self.moves[start:stop]:
+            game.replay_move(*decode_history_move(code, self.size))
+            yield game
+
+    def undo(self, game):
+        # Снимок позиции до последнего хода (и ход удаляется) или None
+        if not self.moves:
+            return None
+        self.moves.pop()
+        count = len(self.moves)
+        del self.checkpoints[count // HISTORY_CHECKPOINT_EVERY + 1:]
+        index = count - self._undo_base
+        if not 0 <= index < len(self._undo_states):
+            self._undo_base = count - count % HISTORY_CHECKPOINT_EVERY
+            scratch = game.copy()
+            scratch.restore(self.checkpoints[-1])
+            self._undo_states = [scratch.snapshot()]
+            for position in self.replay(scratch, self._undo_base, count):
+                self._undo_states.append(position.snapshot())
+            index = count - self._undo_base
+        del self._undo_states[index + 1:]
+        return self._undo_states[index]
+
+    def save(self, path, start_cells, start_score):
+        moves = array('H', self.moves)
+        if sys.byteorder == "big":
+            moves.byteswap()
+        with open(path, "wb") as f:
+            f.write(HISTORY_MAGIC + struct.pack("<BQI", self.size, start_score, len(moves)))
+            f.write(bytes(start_cells))
+            f.write(moves.tobytes())
+
+    @staticmethod
+    def read(path):
+        # (размер, степени клеток начальной доски, начальный счёт, коды ходов)
+        with open(path, "rb") as f:
+            if f.read(4) != HISTORY_MAGIC:
+                raise ValueError(f"{path}: это не запись партии 6561")
+            size, score, count = struct.unpack("<BQI", f.read(struct.calcsize("<BQI")))
+            cells = f.read(size * size)
+            moves = array('H')
+            moves.frombytes(f.read(2 * count))
+        if len(cells) != size * size or len(moves) != count:
+            raise ValueError(f"{path}: запись партии обрезана")
+        if sys.byteorder == "big":
+            moves.byteswap()
+        return size, cells, score, moves
+
+# ---------------------------------------------------------
+# Игра без окна: доска, ходы, появление плиток, счёт и конец игры
+# ---------------------------------------------------------
+# Правила те же, что в окне 6561: после каждого хода, который что-то
+# сдвинул, в случайную пустую клетку ставится 3 (90%) или 9 (10%);
+# игра кончается победой на плитке 6561 или когда ходов больше нет.
+SPAWN_THREE_CHANCE = 0.9
+
+class Game6561:
+    # Методы с доской (_move_board, _best_exponent, _empty_board и т.п.)
+    # переопределяет GridGame6561 из game6561_grid.py для досок NxN
+    size = BOARD_SIZE
+    merge_limit = MAX_EXPONENT
+    cell_limit = MAX_EXPONENT     # наибольшая степень, которая помещается в клетку
+    # с track_movements ход запоминает пути плиток (last_movements) и
+    # появившуюся плитку (last_spawn) - для анимации; поиску это не нужно
+    track_movements = False
+    last_movements = ()
+    last_spawn = None
+
+    def __init__(self, rng=random):
+        self.rng = rng
+        self.reset()
+
+    def reset(self):
+        self.board = self._empty_board()
+        self.score = 0
+        self.game_over = False
+        self.won = False
+        # пустые клетки и наличие слияний обновляются при каждом ходе и
+        # появлении плитки, поэтому появление и конец игры не обходят доску
+        self._update_cells()
+        self.spawn()
+        self.spawn()
+        self.history = MoveHistory(self.size, self.snapshot())
+
+    def _empty_board(self):
+        return 0
+
+    def _update_empty(self, merges=None):
+        # merges - слияний в только что сделанном ходе (None - не известно);
+        # упакованной доске он не нужен: маска считается за несколько операций
+        self.empty = empty_mask(self.board)
+        self.empty_count = self.empty.bit_count()
+
+    def _update_cells(self):
+        self._update_empty()
+        self.has_merge = has_merge(self.board)
+
+    def _move_board(self, direction):
+        # (новая доска, очки, сдвинулось ли что-нибудь, число слияний или None)
+        new_board, score = move(self.board, direction)
+        return new_board, score, new_board != self.board, None
+
+    def _best_exponent(self):
+        return max_exponent(self.board)
+
+    def _exponent_at(self, row, col):
+        return get_exponent(self.board, row, col)
+
+    def spawn(self):
+        # Новая плитка как в add_new_tile; возвращает (row, col, exponent) или None.
+        # Клетка выбирается тем же вызовом rng.choice по номеру пустой клетки,
+        # что и прежде по списку empty_cells, поэтому партии с зерном не меняются
+        if not self.empty_count:
+            return None
+        cell = nth_cell(self.empty, self.rng.choice(range(self.empty_count)))
+        row, col = divmod(cell, BOARD_SIZE)
+        exponent = 1 if self.rng.random() < SPAWN_THREE_CHANCE else 2
+        self.place(row, col, exponent)
+        return row, col, exponent
+
+    def place(self, row, col, exponent):
+        self.board = set_exponent(self.board, row, col, exponent)
+        self._update_cells()
+
+    def play(self, direction):
+        # Ход с появлением плитки; False, если ход ничего не сдвинул
+        return self._play(direction, None, False)
+
+    def replay_move(self, direction, spawned):
+        # Ход из записи: плитка spawned ставится без генератора случайных чисел
+        return self._play(direction, spawned, True)
+
+    def _play(self, direction, spawned, replaying):
+        new_board, score_add, changed, merges = self._move_board(direction)
+        if not changed:
+            return False
+        if self.track_movements:
+            self.last_movements = tile_movements(self._exponent_at, self.size, direction, self.merge_limit)
+        self.board = new_board
+        self.score += score_add
+        # плитка 6561 появляется только слиянием, а оно приносит не меньше 6561 очков
+        if score_add >= 3 ** WIN_EXPONENT and self._best_exponent() >= WIN_EXPONENT:
+            self.won = True
+        # слияния пересчитываются один раз - после появления плитки
+        self._update_empty(merges)
+        if not replaying:
+            spawned = self.spawn()
+        elif spawned is not None:
+            row, col, exponent = spawned
+            # плитка из записи должна встать в пустую клетку доски
+            if row >= self.size or exponent not in (1, 2) or self._exponent_at(row, col):
+                raise ValueError(f"плитка {spawned} не может появиться на доске")
+            self.place(row, col, exponent)
+        if spawned is None:
+            self._update_cells()
+        self.last_spawn = spawned
+        if self.history is not None:
+            self.history.record(self, direction, spawned)
+        self.game_over = self.check_game_over()
+        return True
+
+    def check_game_over(self):
+        if self.won:
+            return True
+        return not self.empty_count and not self.has_merge
+
+    def legal_moves(self):
+        return [direction for direction in DIRECTIONS if self._move_board(direction)[2]]
+
+    def values(self):
+        return unpack(self.board)
+
+    def snapshot(self):
+        return self.board, self.score
+
+    def restore(self, snapshot):
+        self.board, self.score = snapshot
+        self.won = self._best_exponent() >= WIN_EXPONENT
+        self._update_cells()
+        self.game_over = self.check_game_over()
+
+    def undo(self):
+        # Отмена последнего хода; False, если отменять нечего
+        snapshot = self.history.undo(self) if self.history is not None else None
+        if snapshot is None:
+            return False
+        self.restore(snapshot)
+        return True
+
+    def _board_cells(self, board):
+        return [(board >> (4 * cell)) & 0xF for cell in range(BOARD_SIZE * BOARD_SIZE)]
+
+    def _board_from_cells(self, cells):
+        board = 0
+        for cell, exponent in enumerate(cells):
+            board |= exponent << (4 * cell)
+        return board
+
+    def save_history(self, path):
+        start_board, start_score = self.history.start
+        self.history.save(path, self._board_cells(start_board), start_score)
+
+    def load_history(self, path):
+        # Партия из файла: начальная доска и все ходы повторяются заново
+        size, cells, score, moves = MoveHistory.read(path)
+        if size != self.size:
+            raise ValueError(f"{path}: партия на доске {size}x{size}, а не {self.size}x{self.size}")
+        if max(cells, default=0) > self.cell_limit:
+            raise ValueError(f"{path}: степень плитки на начальной доске слишком велика")
+        previous, history = self.snapshot(), self.history
+        try:
+            self.restore((self._board_from_cells(cells), score))
+            self.history = MoveHistory(self.size, self.snapshot())
+            for code in moves:
+                if not self.replay_move(*decode_history_move(code, self.size)):
+                    raise ValueError(f"ход {len(self.history) + 1} ничего не сдвигает")
+        except Exception as e:
+            # испорченная запись - партия остаётся прежней
+            self.restore(previous)
+            self.history = history
+            if isinstance(e, ValueError):
+                raise ValueError(f"{path}: {e}") from e
+            raise
+
+    def copy(self):
+        new = self.__class__.__new__(self.__class__)
+        new.__dict__.update(self.__dict__)
+        new.history = None            # копии (поиск, отмена) историю не ведут
+        return new
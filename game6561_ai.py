@@ -0,0 +1,373 @@
+import multiprocessing
+import os
+import random
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from game6561 import (
+    BOARD_SIZE, DIRECTIONS, WIN_EXPONENT, SPAWN_THREE_CHANCE, move, transpose, empty_cells,
+    max_exponent, set_exponent,
+)
+
+# ================== НАСТРОЙКИ ПОМОЩНИКА ==================
+AI_TIME_LIMIT = 0.3       # секунд на выбор хода (подсказка и автоигра)
+AI_MAX_DEPTH = 6          # предел итеративного углубления (ходов игрока)
+AI_PROB_CUTOFF = 0.0001   # маловероятные ветви появления плиток не раскрываются
+AI_CHECK_EVERY = 64       # как часто (в узлах) проверяется время и флаг остановки
+
+MC_TIME_LIMIT = AI_TIME_LIMIT   # секунд на ход советника Монте-Карло
+MC_WORKERS = os.cpu_count() or 1
+MC_ROLLOUT_DEPTH = 300    # предел ходов в одной случайной партии
+MC_GRACE = 0.05           # сколько ждать опоздавшие процессы после срока
+
+# Веса оценки доски (степени и веса подобраны под 4x4)
+LOST_PENALTY = 200000.0
+WIN_BONUS = 1e9
+MONOTONICITY_POWER = 4.0
+MONOTONICITY_WEIGHT = 47.0
+SUM_POWER = 3.5
+SUM_WEIGHT = 11.0
+MERGES_WEIGHT = 700.0
+EMPTY_WEIGHT = 270.0
+# =========================================================
+
+class SearchAborted(Exception):
+    pass
+
+# ---------------------------------------------------------
+# Оценка доски: сумма оценок строк и столбцов по таблице на 65536 строк
+# ---------------------------------------------------------
+def _row_heuristic(cells):
+    empty = 0
+    merges = 0
+    total = 0.0
+    previous = 0
+    counter = 0
+    for exponent in cells:
+        total += exponent ** SUM_POWER
+        if exponent == 0:
+            empty += 1
+            continue
+        # равные плитки подряд (через пустые) - будущие слияния
+        if previous == exponent:
+            counter += 1
+        elif counter > 0:
+            merges += 1 + counter
+            counter = 0
+        previous = exponent
+    if counter > 0:
+        merges += 1 + counter
+
+    # немонотонность: насколько строка не убывает/не возрастает
+    monotonicity_left = 0.0
+    monotonicity_right = 0.0
+    for i in range(1, BOARD_SIZE):
+        a = cells[i - 1] ** MONOTONICITY_POWER
+        b = cells[i] ** MONOTONICITY_POWER
+        if cells[i - 1] > cells[i]:
+            monotonicity_left += a - b
+        else:
+            monotonicity_right += b - a
+
+    return (LOST_PENALTY + EMPTY_WEIGHT * empty + MERGES_WEIGHT * merges
+            - MONOTONICITY_WEIGHT * min(monotonicity_left, monotonicity_right)
+            - SUM_WEIGHT * total)
+
+def _build_heuristic_table():
+    table = array('d', bytes(8 * 65536))
+    for row in range(65536):
+        table[row] = _row_heuristic([(row >> (4 * i)) & 0xF for i in range(BOARD_SIZE)])
+    return table
+
+ROW_HEURISTIC = _build_heuristic_table()
+
+def evaluate(board):
+    table = ROW_HEURISTIC
+    columns = transpose(board)
+    return (table[board & 0xFFFF] + table[(board >> 16) & 0xFFFF]
+            + table[(board >> 32) & 0xFFFF] + table[board >> 48]
+            + table[columns & 0xFFFF] + table[(columns >> 16) & 0xFFFF]
+            + table[(columns >> 32) & 0xFFFF] + table[columns >> 48])
+
+# ---------------------------------------------------------
+# Expectimax: ход игрока - максимум, появление плитки - среднее по
+# пустым клеткам (3 с вероятностью 0.9, 9 - 0.1, как в add_new_tile)
+# ---------------------------------------------------------
+class ExpectimaxAI:
+    def __init__(self, time_limit=AI_TIME_LIMIT, max_depth=AI_MAX_DEPTH, prob_cutoff=AI_PROB_CUTOFF):
+        self.time_limit = time_limit
+        self.max_depth = max_depth
+        self.prob_cutoff = prob_cutoff
+        self.nodes = 0
+        self.depth = 0            # глубина последней завершённой итерации
+        self._cache = {}
+        self._deadline = None
+        self._stop_event = None
+
+    def best_move(self, board, stop_event=None):
+        # Итеративное углубление: при нехватке времени или по stop_event
+        # возвращается лучший ход последней завершённой глубины; None - ходов нет
+        self._stop_event = stop_event
+        self._deadline = time.perf_counter() + self.time_limit if self.time_limit else None
+        self.nodes = 0
+        self.depth = 0
+        moves = [d for d in DIRECTIONS if move(board, d)[0] != board]
+        if len(moves) <= 1:
+            return moves[0] if moves else None
+        best_move = moves[0]
+        for depth in range(1, self.max_depth + 1):
+            self._cache = {}
+            try:
+                best_move = self._search_root(board, moves, depth)
+            except SearchAborted:
+                break
+            self.depth = depth
+        return best_move
+
+    def _search_root(self, board, moves, depth):
+        best_score = -float('inf')
+        best_move = moves[0]
+        for direction in moves:
+            new_board, score = move(board, direction)
+            value = self._chance(new_board, score, depth - 1, 1.0)
+            if value > best_score:
+                best_score = value
+                best_move = direction
+        return best_move
+
+    def _check_abort(self):
+        # sleep(0) отпускает GIL: поток окна успевает рисовать кадры
+        time.sleep(0)
+        if self._stop_event is not None and self._stop_event.is_set():
+            raise SearchAborted()
+        if self._deadline is not None and time.perf_counter() > self._deadline:
+            raise SearchAborted()
+
+    def _chance(self, board, gained, depth, prob):
+        self.nodes += 1
+        if self.nodes % AI_CHECK_EVERY == 0:
+            self._check_abort()
+        if gained >= 3 ** WIN_EXPONENT and max_exponent(board) >= WIN_EXPONENT:
+            return WIN_BONUS
+        if depth <= 0 or prob < self.prob_cutoff:
+            return evaluate(board)
+        cached = self._cache.get(board)
+        if cached is not None and cached[0] >= depth:
+            return cached[1]
+
+        cells = empty_cells(board)
+        share = prob / len(cells)
+        total = 0.0
+        for row, col in cells:
+            shift = 4 * (BOARD_SIZE * row + col)
+            total += 0.9 * self._max(board | (1 << shift), depth, share * 0.9)
+            total += 0.1 * self._max(board | (2 << shift), depth, share * 0.1)
+        value = total / len(cells)
+        self._cache[board] = (depth, value)
+        return value
+
+    def _max(self, board, depth, prob):
+        best = None
+        for direction in DIRECTIONS:
+            new_board, score = move(board, direction)
+            if new_board != board:
+                value = self._chance(new_board, score, depth - 1, prob)
+                if best is None or value > best:
+                    best = value
+        # ходов нет - партия проиграна
+        return 0.0 if best is None else best
+
+    def close(self):
+        pass
+
+# ---------------------------------------------------------
+# Монте-Карло: для каждого хода много случайных партий до конца,
+# выбирается ход с наибольшим средним счётом. Партии идут в пуле
+# процессов (запуск spawn: fork из потока AIThinker в процессе с окном
+# pygame ненадёжен), у каждой задачи своё зерно генератора.
+# ---------------------------------------------------------
+def _random_rollout(board, rng, max_depth):
+    # Очки случайной партии от доски сразу после хода игрока (до появления плитки)
+    total = 0
+    directions = list(DIRECTIONS)
+    for _ in range(max_depth):
+        cells = empty_cells(board)
+        if not cells:
+            break
+        row, col = rng.choice(cells)
+        board = set_exponent(board, row, col, 1 if rng.random() < SPAWN_THREE_CHANCE else 2)
+        rng.shuffle(directions)
+        for direction in directions:
+            new_board, score = move(board, direction)
+            if new_board != board:
+                break
+        else:
+            break                 # ходов нет - партия проиграна
+        board = new_board
+        total += score
+        if score >= 3 ** WIN_EXPONENT and max_exponent(board) >= WIN_EXPONENT:
+            break
+    return total
+
+_rollout_abort = None             # в процессе пула: сигнал остановки от MonteCarloAI
+
+def _init_rollout_worker(abort_event):
+    global _rollout_abort
+    _rollout_abort = abort_event
+
+def _rollout_worker(board, moves, deadline, rounds, seed, max_depth):
+    # Выполняется в процессе пула: партии по всем ходам по кругу - rounds
+    # кругов или, если rounds None, до срока deadline (time.time(), общее
+    # для всех процессов время); по сигналу остановки - сразу
+    rng = random.Random(seed)
+    totals = [0] * len(moves)
+    counts = [0] * len(moves)
+    done = 0
+    while rounds is None or done < rounds:
+        for i, direction in enumerate(moves):
+            new_board, score = move(board, direction)
+            totals[i] += score + _random_rollout(new_board, rng, max_depth)
+            counts[i] += 1
+        done += 1
+        if deadline is not None and time.time() >= deadline:
+            break
+        if _rollout_abort.is_set():
+            break
+    return totals, counts
+
+class MonteCarloAI:
+    def __init__(self, time_limit=MC_TIME_LIMIT, workers=MC_WORKERS, max_depth=MC_ROLLOUT_DEPTH, seed=None,
+                 fixed_rollouts=None):
+        self.time_limit = time_limit
+        self.workers = workers
+        self.max_depth = max_depth
+        self.fixed_rollouts = fixed_rollouts   # партий на ход без срока (повторяемый поиск) или None
+        self.seeds = random.Random(seed)
+        self.rollouts = 0         # партий в последнем поиске
+        self.rollouts_per_second = 0.0
+        self.executor = None
+        self.abort = None
+        self.stragglers = set()   # задачи прошлого поиска, брошенные после срока
+
+    def _get_executor(self):
+        if self.executor is None:
+            context = multiprocessing.get_context("spawn")
+            self.abort = context.Event()
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context,
+                                                initializer=_init_rollout_worker,
+                                                initargs=(self.abort,))
+            # spawn долго запускает процессы: дождаться их здесь, а не
+            # бросать задачи первого поиска опоздавшими
+            wait([self.executor.submit(os.getpid) for _ in range(self.workers)])
+        # Брошенные задачи уже получили сигнал остановки и заканчивают
+        # текущий круг; новые ставятся после них, иначе ждали бы в очереди
+        # пула за опоздавшими
+        if self.stragglers:
+            wait(self.stragglers)
+            self.stragglers = set()
+        self.abort.clear()
+        return self.executor
+
+    def best_move(self, board, stop_event=None):
+        # По времени ответ не позже time_limit + MC_GRACE: задачи сами
+        # останавливаются к сроку, опоздавшие не ждутся. С fixed_rollouts
+        # каждый ход проверяется ровно столько партиями, и при том же seed
+        # ответы повторяются. None - ходов нет
+        moves = [d for d in DIRECTIONS if move(board, d)[0] != board]
+        self.rollouts = 0
+        if len(moves) <= 1:
+            return moves[0] if moves else None
+        executor = self._get_executor()
+
+        start = time.perf_counter()
+        if self.fixed_rollouts is None:
+            deadline = time.time() + self.time_limit
+            wait_until = start + self.time_limit + MC_GRACE
+            rounds = [None] * self.workers
+        else:
+            deadline = wait_until = None
+            share, extra = divmod(self.fixed_rollouts, self.workers)
+            rounds = [share + (i < extra) for i in range(self.workers) if share + (i < extra)]
+        futures = {executor.submit(_rollout_worker, board, moves, deadline, task_rounds,
+                                   self.seeds.getrandbits(64), self.max_depth)
+                   for task_rounds in rounds}
+        pending = futures
+        while pending:
+            timeout = 0.02
+            if wait_until is not None:
+                timeout = min(wait_until - time.perf_counter(), timeout)
+            if timeout <= 0 or (stop_event is not None and stop_event.is_set()):
+                break
+            _, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if pending:
+            self.abort.set()
+            self.stragglers = pending
+
+        totals = [0] * len(moves)
+        counts = [0] * len(moves)
+        for future in futures - pending:
+            worker_totals, worker_counts = future.result()
+            for i in range(len(moves)):
+                totals[i] += worker_totals[i]
+                counts[i] += worker_counts[i]
+        self.rollouts = sum(counts)
+        self.rollouts_per_second = self.rollouts / (time.perf_counter() - start)
+        # ни одна задача не успела (например, процессы ещё запускаются) - первый ход
+        best = max(range(len(moves)), key=lambda i: totals[i] / counts[i] if counts[i] else -1.0)
+        return moves[best]
+
+    def close(self):
+        if self.executor is not None:
+            self.abort.set()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+            self.stragglers = set()
+
+# Советники для окна игры: имя -> класс
+ADVISORS = {'expectimax': ExpectimaxAI, 'montecarlo': MonteCarloAI}
+
+# ---------------------------------------------------------
+# Поиск в фоне, чтобы окно игры не замирало (как BotThinker в крестиках)
+# ---------------------------------------------------------
+class AIThinker:
+    def __init__(self, ai):
+        self.ai = ai
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.future = None
+        self.stop_event = None
+        self.board = None         # доска, для которой ищется ход
+
+    def start(self, board):
+        self.cancel()
+        self.board = board
+        self.stop_event = threading.Event()
+        self.future = self.executor.submit(self.ai.best_move, board, self.stop_event)
+
+    def is_thinking(self):
+        return self.future is not None
+
+    def poll(self):
+        # (True, ход), когда поиск завершён, иначе (False, None)
+        if self.future is None or not self.future.done():
+            return False, None
+        future = self.future
+        self.future = None
+        return True, future.result()
+
+    def cancel(self):
+        if self.future is not None:
+            self.stop_event.set()
+            self.future.cancel()
+            self.future = None
+
+    def set_ai(self, ai):
+        self.cancel()
+        self.ai.close()
+        self.ai = ai
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False)
+        self.ai.close()
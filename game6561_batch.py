@@ -0,0 +1,198 @@
+import argparse
+import time
+
+import numpy as np
+
+from game6561 import (
+    BOARD_SIZE, DIRECTIONS, LEFT, RIGHT, UP, DOWN, WIN_EXPONENT, MAX_EXPONENT, SPAWN_THREE_CHANCE,
+    ROW_LEFT, ROW_RIGHT, ROW_LEFT_SCORE, ROW_RIGHT_SCORE, exponent_of,
+)
+
+# ---------------------------------------------------------
+# Пакетный симулятор 6561 на NumPy: тысячи упакованных досок (как в
+# game6561.py - 64-битное число на доску) ходят одновременно. Ходы - те же
+# таблицы строк, только выборка сразу по массиву строк всех досок.
+# Нужен для подбора вероятности появления тройки и порога победы.
+# Запуск: python game6561_batch.py --games 10000 --policy corner
+# ---------------------------------------------------------
+
+CELLS = BOARD_SIZE * BOARD_SIZE
+ROW_SHIFTS = [np.uint64(16 * row) for row in range(BOARD_SIZE)]
+CELL_SHIFTS = np.arange(CELLS, dtype=np.uint64) * np.uint64(4)
+NP_ROW_MASK = np.uint64(0xFFFF)
+NIBBLE_MASK = np.uint64(0xF)
+
+NP_ROW_LEFT = np.array(ROW_LEFT, dtype=np.uint64)
+NP_ROW_RIGHT = np.array(ROW_RIGHT, dtype=np.uint64)
+NP_ROW_LEFT_SCORE = np.array(ROW_LEFT_SCORE, dtype=np.int64)
+NP_ROW_RIGHT_SCORE = np.array(ROW_RIGHT_SCORE, dtype=np.int64)
+
+# Порядок предпочтения ходов для стратегии "corner": копить плитки в углу
+CORNER_ORDER = (DOWN, LEFT, RIGHT, UP)
+POLICIES = ('random', 'corner')
+
+def transpose_batch(boards):
+    # То же транспонирование, что transpose в game6561, для массива досок
+    a1 = boards & np.uint64(0xF0F00F0FF0F00F0F)
+    a2 = boards & np.uint64(0x0000F0F00000F0F0)
+    a3 = boards & np.uint64(0x0F0F00000F0F0000)
+    a = a1 | (a2 << np.uint64(12)) | (a3 >> np.uint64(12))
+    b1 = a & np.uint64(0xFF00FF0000FF00FF)
+    b2 = a & np.uint64(0x00FF00FF00000000)
+    b3 = a & np.uint64(0x00000000FF00FF00)
+    return b1 | (b2 >> np.uint64(24)) | (b3 << np.uint64(24))
+
+def _move_rows_batch(boards, table, score_table):
+    result = np.zeros_like(boards)
+    score = np.zeros(boards.shape, dtype=np.int64)
+    for shift in ROW_SHIFTS:
+        rows = (boards >> shift) & NP_ROW_MASK
+        result |= table[rows] << shift
+        score += score_table[rows]
+    return result, score
+
+def move_batch(boards, direction):
+    # (новые доски, очки) для всех досок одним направлением, как move()
+    if direction == LEFT:
+        return _move_rows_batch(boards, NP_ROW_LEFT, NP_ROW_LEFT_SCORE)
+    if direction == RIGHT:
+        return _move_rows_batch(boards, NP_ROW_RIGHT, NP_ROW_RIGHT_SCORE)
+    if direction == UP:
+        result, score = _move_rows_batch(transpose_batch(boards), NP_ROW_LEFT, NP_ROW_LEFT_SCORE)
+    else:
+        result, score = _move_rows_batch(transpose_batch(boards), NP_ROW_RIGHT, NP_ROW_RIGHT_SCORE)
+    return transpose_batch(result), score
+
+def cells_batch(boards):
+    # Степени всех клеток: массив (число досок, 16) в порядке обхода строк
+    return (boards[:, None] >> CELL_SHIFTS) & NIBBLE_MASK
+
+def all_moves_batch(boards):
+    # Доски и очки после каждого из четырёх ходов: массивы (число досок, 4)
+    moved = np.empty((len(boards), len(DIRECTIONS)), dtype=np.uint64)
+    scores = np.empty((len(boards), len(DIRECTIONS)), dtype=np.int64)
+    for direction in DIRECTIONS:
+        moved[:, direction], scores[:, direction] = move_batch(boards, direction)
+    return moved, scores
+
+# ---------------------------------------------------------
+# Партии пачкой: массивы досок, счёта, числа ходов и флагов конца
+# ---------------------------------------------------------
+class BatchGame6561:
+    def __init__(self, count, seed=None, three_chance=SPAWN_THREE_CHANCE, win_exponent=WIN_EXPONENT):
+        self.rng = np.random.default_rng(seed)
+        self.three_chance = three_chance
+        self.win_exponent = win_exponent
+        self.boards = np.zeros(count, dtype=np.uint64)
+        self.scores = np.zeros(count, dtype=np.int64)
+        self.moves = np.zeros(count, dtype=np.int64)
+        self.game_over = np.zeros(count, dtype=bool)
+        self.won = np.zeros(count, dtype=bool)
+        self._next = None         # ходы из текущих досок, посчитанные в check_game_over
+        everyone = np.ones(count, dtype=bool)
+        self.spawn(everyone)
+        self.spawn(everyone)
+        self.check_game_over()
+
+    def spawn(self, mask):
+        # Новая плитка на досках из mask: случайная пустая клетка,
+        # 3 с вероятностью three_chance, иначе 9 (как Game6561.spawn)
+        index = np.flatnonzero(mask)
+        empty = cells_batch(self.boards[index]) == 0
+        counts = empty.sum(axis=1)
+        has_room = counts > 0
+        index, empty, counts = index[has_room], empty[has_room], counts[has_room]
+        if not len(index):
+            return
+        chosen = (self.rng.random(len(index)) * counts).astype(np.int64)
+        cells = np.argmax(np.cumsum(empty, axis=1) > chosen[:, None], axis=1)
+        exponents = np.where(self.rng.random(len(index)) < self.three_chance, 1, 2).astype(np.uint64)
+        self.boards[index] |= exponents << CELL_SHIFTS[cells]
+
+    def legal_moves(self):
+        # Маска (число досок, 4): ход меняет доску; вместе с досками после ходов
+        moved, scores = self._next if self._next is not None else all_moves_batch(self.boards)
+        return moved != self.boards[:, None], moved, scores
+
+    def play(self, directions):
+        # Ход directions[i] на каждой незаконченной доске; ход, который ничего
+        # не сдвигает, пропускается, как в Game6561.play
+        legal, moved, scores = self.legal_moves()
+        rows = np.arange(len(self.boards))
+        active = ~self.game_over & legal[rows, directions]
+        self.boards[active] = moved[rows, directions][active]
+        self.scores[active] += scores[rows, directions][active]
+        self.moves[active] += 1
+        self._next = None
+        self.spawn(active)
+        self.check_game_over()
+        return active
+
+    def check_game_over(self):
+        best = cells_batch(self.boards).max(axis=1)
+        self.won |= best >= self.win_exponent
+        self._next = all_moves_batch(self.boards)
+        can_move = (self._next[0] != self.boards[:, None]).any(axis=1)
+        self.game_over |= self.won | ~can_move
+        return self.game_over
+
+    def max_exponents(self):
+        return cells_batch(self.boards).max(axis=1).astype(np.int64)
+
+def choose_moves(legal, policy, rng):
+    # Ход для каждой доски по маске допустимых ходов
+    if policy == 'random':
+        # случайный допустимый: максимум случайных весов среди разрешённых
+        weights = np.where(legal, rng.random(legal.shape), -1.0)
+        return np.argmax(weights, axis=1)
+    order = np.array(CORNER_ORDER)
+    return order[np.argmax(legal[:, order], axis=1)]
+
+def simulate(count, policy='random', seed=None, three_chance=SPAWN_THREE_CHANCE,
+             win_exponent=WIN_EXPONENT, max_moves=None):
+    # Играет count партий до конца (или max_moves шагов); возвращает BatchGame6561
+    games = BatchGame6561(count, seed, three_chance, win_exponent)
+    steps = 0
+    while not games.game_over.all():
+        if max_moves is not None and steps >= max_moves:
+            break
+        legal = games.legal_moves()[0]
+        games.play(choose_moves(legal, policy, games.rng))
+        steps += 1
+    return games
+
+def report(games, elapsed):
+    count = len(games.boards)
+    board_moves = int(games.moves.sum())
+    print(f"Партий: {count}, ходов: {board_moves}, {elapsed:.2f} с, "
+          f"{board_moves / elapsed:.0f} ходов досок/с, {count / elapsed:.1f} партий/с")
+    print(f"Побед: {int(games.won.sum())} ({games.won.mean() * 100:.2f}%)")
+    percentiles = np.percentile(games.scores, [0, 10, 50, 90, 100])
+    print("Счёт: мин {:.0f}, 10% {:.0f}, медиана {:.0f}, 90% {:.0f}, макс {:.0f}, среднее {:.0f}".format(
+        *percentiles, games.scores.mean()))
+    exponents, counts = np.unique(games.max_exponents(), return_counts=True)
+    for exponent, number in zip(exponents, counts):
+        print(f"  наибольшая плитка {3 ** int(exponent):>6}: {number:6d} ({number / count * 100:5.1f}%)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная симуляция партий 6561")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--policy", choices=POLICIES, default='random')
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--three-chance", type=float, default=SPAWN_THREE_CHANCE,
+                        help="вероятность, что новая плитка - 3 (иначе 9)")
+    parser.add_argument("--win", type=int, default=3 ** WIN_EXPONENT,
+                        help="плитка победы (степень тройки)")
+    parser.add_argument("--max-moves", type=int, help="предел ходов на партию")
+    args = parser.parse_args()
+
+    win_exponent = exponent_of(args.win)
+    if 3 ** win_exponent != args.win or not 1 <= win_exponent <= MAX_EXPONENT:
+        parser.error(f"--win должна быть степенью тройки от 3 до {3 ** MAX_EXPONENT}")
+
+    start = time.perf_counter()
+    games = simulate(args.games, args.policy, args.seed, args.three_chance, win_exponent, args.max_moves)
+    report(games, time.perf_counter() - start)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+import os
+import random
+import struct
+import tempfile
+import time
+
+from game6561 import (
+    BOARD_SIZE, DIRECTIONS, SPAWN_THREE_CHANCE, Game6561, move, pack, unpack, can_move, max_exponent,
+    empty_cells, empty_mask, has_merge, nth_cell, set_exponent, get_exponent, tile_movements,
+    exponent_of, WIN_EXPONENT, LEFT,
+)
+
+# ---------------------------------------------------------
+# Проверки и замеры скорости для игры 6561.
+# Запуск: python game6561_bench.py
+# ---------------------------------------------------------
+
+# Прежние compress/merge на списках - эталон для таблиц строк
+def _reference_line(row):
+    size = len(row)
+
+    def compress(row):
+        new_row = [0] * size
+        pos = 0
+        for value in row:
+            if value != 0:
+                new_row[pos] = value
+                pos += 1
+        return new_row
+
+    row = compress(row)
+    score = 0
+    for i in range(size - 1):
+        if row[i] != 0 and row[i] == row[i + 1]:
+            row[i] *= 3
+            row[i + 1] = 0
+            score += row[i]
+    return compress(row), score
+
+def _reference_move(board, direction):
+    # direction - LEFT, RIGHT, UP, DOWN из game6561 (0..3); доска любого размера
+    board = [row[:] for row in board]
+    size = len(board)
+    total = 0
+    for k in range(size):
+        if direction == 0:
+            cells = [(k, j) for j in range(size)]
+        elif direction == 1:
+            cells = [(k, j) for j in range(size - 1, -1, -1)]
+        elif direction == 2:
+            cells = [(i, k) for i in range(size)]
+        else:
+            cells = [(i, k) for i in range(size - 1, -1, -1)]
+        line, score = _reference_line([board[i][j] for i, j in cells])
+        total += score
+        for (i, j), value in zip(cells, line):
+            board[i][j] = value
+    return board, total
+
+def _random_boards(count, seed, size=BOARD_SIZE):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield [[3 ** rng.randint(1, 8) if rng.random() < 0.7 else 0
+                for _ in range(size)] for _ in range(size)]
+
+def check_move_equivalence(count=20000, seed=0):
+    for values in _random_boards(count, seed):
+        board = pack(values)
+        if unpack(board) != values:
+            raise AssertionError("pack/unpack искажают доску")
+        for direction in DIRECTIONS:
+            expected = _reference_move(values, direction)
+            new_board, score = move(board, direction)
+            if (unpack(new_board), score) != expected:
+                raise AssertionError(f"ход {direction} разошёлся с эталоном: {values}")
+    return count
+
+def bench_moves(count=2000, seed=1):
+    boards = list(_random_boards(count, seed))
+    packed = [pack(values) for values in boards]
+    start = time.perf_counter()
+    for values in boards:
+        for direction in DIRECTIONS:
+            _reference_move(values, direction)
+    reference = time.perf_counter() - start
+    start = time.perf_counter()
+    for board in packed:
+        for direction in DIRECTIONS:
+            move(board, direction)
+    tables = time.perf_counter() - start
+    moves = count * len(DIRECTIONS)
+    print(f"Ход: списки {reference / moves * 1e6:.1f} мкс, таблицы {tables / moves * 1e6:.1f} мкс")
+
+def _reference_game(seed):
+    # Прежняя партия: список пустых клеток и три обхода доски на каждом ходу
+    rng = random.Random(seed)
+    board = 0
+    score = 0
+
+    def spawn(board):
+        cells = empty_cells(board)
+        if not cells:
+            return board
+        row, col = rng.choice(cells)
+        return set_exponent(board, row, col, 1 if rng.random() < SPAWN_THREE_CHANCE else 2)
+
+    board = spawn(spawn(board))
+    history = [board]
+    while max_exponent(board) < 8 and can_move(board):
+        moves = [d for d in DIRECTIONS if move(board, d)[0] != board]
+        board, gained = move(board, rng.choice(moves))
+        score += gained
+        board = spawn(board)
+        history.append(board)
+    return history, score
+
+def check_incremental_equivalence(count=20000, games=300, seed=6):
+    # Маски пустых клеток и слияний против обхода доски, и партии с тем же
+    # зерном против прежнего движка
+    for values in _random_boards(count, seed):
+        board = pack(values)
+        mask = empty_mask(board)
+        cells = [(i // BOARD_SIZE, i % BOARD_SIZE) for i in range(BOARD_SIZE * BOARD_SIZE) if mask >> (4 * i) & 1]
+        if cells != empty_cells(board):
+            raise AssertionError(f"маска пустых клеток неверна: {values}")
+        if [divmod(nth_cell(mask, n), BOARD_SIZE) for n in range(len(cells))] != cells:
+            raise AssertionError(f"nth_cell неверна: {values}")
+        # на непустой доске ход есть, если есть пустая клетка или пара для слияния
+        if board and (bool(mask) or has_merge(board)) != can_move(board):
+            raise AssertionError(f"has_merge не совпал с can_move: {values}")
+    for game_seed in range(games):
+        history, score = _reference_game(game_seed)
+        rng = random.Random(game_seed)
+        game = Game6561(rng)
+        boards = [game.board]
+        while not game.game_over:
+            game.play(rng.choice(game.legal_moves()))
+            boards.append(game.board)
+        if boards != history or game.score != score:
+            raise AssertionError(f"партия с зерном {game_seed} разошлась с прежним движком")
+    return count, games
+
+def bench_random_games(games=200, seed=2):
+    # Случайные партии движком без окна: сколько ходов в секунду
+    rng = random.Random(seed)
+    moves = 0
+    start = time.perf_counter()
+    for _ in range(games):
+        game = Game6561(rng)
+        while not game.game_over:
+            game.play(rng.choice(game.legal_moves()))
+            moves += 1
+    elapsed = time.perf_counter() - start
+    print(f"Случайные партии: {games} партий, {moves} ходов, {moves / elapsed:.0f} ходов/с")
+
+def check_batch_equivalence(count=20000, seed=3):
+    # Пакетные ходы NumPy должны совпадать с табличными ходами по одной доске
+    import numpy as np
+    from game6561_batch import all_moves_batch, BatchGame6561
+
+    packed = [pack(values) for values in _random_boards(count, seed)]
+    moved, scores = all_moves_batch(np.array(packed, dtype=np.uint64))
+    for i, board in enumerate(packed):
+        for direction in DIRECTIONS:
+            if (int(moved[i, direction]), int(scores[i, direction])) != move(board, direction):
+                raise AssertionError(f"пакетный ход {direction} разошёлся с move: {unpack(board)}")
+    games = BatchGame6561(count)
+    games.boards[:] = packed
+    games.check_game_over()
+    for i, board in enumerate(packed):
+        won = max_exponent(board) >= WIN_EXPONENT
+        if (bool(games.won[i]), bool(games.game_over[i])) != (won, won or not can_move(board)):
+            raise AssertionError(f"пакетный конец игры разошёлся с движком: {unpack(board)}")
+    return count
+
+def bench_batch(count=10000, seed=4):
+    from game6561_batch import simulate
+
+    start = time.perf_counter()
+    games = simulate(count, seed=seed)
+    elapsed = time.perf_counter() - start
+    print(f"Пакет NumPy: {count} случайных партий, {games.moves.sum() / elapsed:.0f} ходов/с")
+
+def bench_monte_carlo(moves=20, seed=5):
+    # Советник Монте-Карло: партий в секунду и задержка ответа на ход
+    from game6561_ai import MonteCarloAI
+
+    ai = MonteCarloAI(time_limit=0.1, seed=seed)
+    game = Game6561(random.Random(seed))
+    latencies = []
+    speeds = []
+    try:
+        for _ in range(moves):
+            if game.game_over:
+                break
+            start = time.perf_counter()
+            game.play(ai.best_move(game.board))
+            latencies.append(time.perf_counter() - start)
+            speeds.append(ai.rollouts_per_second)
+    finally:
+        ai.close()
+    # первый ход включает запуск процессов
+    print(f"Монте-Карло ({ai.workers} проц.): {sum(speeds[1:]) / (len(speeds) - 1):.0f} партий/с, "
+          f"задержка до {max(latencies[1:]) * 1000:.0f} мс")
+
+def check_monte_carlo_repeatable(moves=5, seed=13):
+    # С fixed_rollouts и одним seed два советника выбирают одни и те же ходы
+    from game6561_ai import MonteCarloAI
+
+    chosen = []
+    for _ in range(2):
+        ai = MonteCarloAI(seed=seed, fixed_rollouts=20)
+        game = Game6561(random.Random(seed))
+        played = []
+        try:
+            for _ in range(moves):
+                played.append(ai.best_move(game.board))
+                game.play(played[-1])
+        finally:
+            ai.close()
+        chosen.append(played)
+    if chosen[0] != chosen[1]:
+        raise AssertionError(f"Монте-Карло с fixed_rollouts не повторяется: {chosen}")
+    return len(chosen[0])
+
+def check_grid_equivalence(count=2000, seed=7):
+    # Векторный ход NxN против прежних compress/merge на списках
+    from game6561_grid import (
+        MIN_SIZE, MAX_SIZE, GRID_MAX_EXPONENT, GridGame6561, move_grid, pack_grid, grid_has_merge,
+    )
+
+    for size in range(MIN_SIZE, MAX_SIZE + 1):
+        for values in _random_boards(count // 4, seed + size, size):
+            grid = pack_grid(values)
+            for direction in DIRECTIONS:
+                new_grid, score, merges = move_grid(grid, direction)
+                new_values = [[3 ** e if e else 0 for e in row] for row in new_grid.tolist()]
+                if (new_values, score) != _reference_move(values, direction):
+                    raise AssertionError(f"ход {direction} на доске {size}x{size} разошёлся с эталоном")
+                if merges != sum(row.count(0) for row in new_values) - sum(row.count(0) for row in values):
+                    raise AssertionError(f"число слияний на доске {size}x{size} разошлось с эталоном")
+            can = any(_reference_move(values, d)[0] != values for d in DIRECTIONS)
+            if all(all(row) for row in values) and grid_has_merge(grid) != can:
+                raise AssertionError(f"grid_has_merge неверна на доске {size}x{size}")
+    # плитки GRID_MAX_EXPONENT не сливаются - степень не выходит за uint8
+    grid = pack_grid([[0] * MIN_SIZE for _ in range(MIN_SIZE)])
+    grid[0, :2] = GRID_MAX_EXPONENT
+    grid[1, :2] = GRID_MAX_EXPONENT - 1
+    new_grid, _, merges = move_grid(grid, LEFT)
+    if new_grid[0, :2].tolist() != [GRID_MAX_EXPONENT] * 2 or new_grid[1, 0] != GRID_MAX_EXPONENT or merges != 1:
+        raise AssertionError("плитки предельной степени слились на доске NxN")
+    # счётчик пустых клеток GridGame6561 ведётся по слияниям и появлениям
+    for size in (MIN_SIZE, MIN_SIZE + 1):
+        rng = random.Random(seed + size)
+        for _ in range(20):
+            game = GridGame6561(size, rng)
+            while not game.game_over:
+                game.play(rng.choice(game.legal_moves()))
+                if game.empty_count != int((game.board == 0).sum()):
+                    raise AssertionError(f"число пустых клеток на доске {size}x{size} разошлось с доской")
+            if not game.won and game.legal_moves():
+                raise AssertionError(f"партия {size}x{size} кончилась при возможном ходе")
+    return count // 4 * (MAX_SIZE - MIN_SIZE + 1)
+
+def bench_grid_sizes(count=200, seed=8):
+    # Цена хода от размера доски: векторный ход и прежние списки
+    from game6561_grid import MIN_SIZE, MAX_SIZE, move_grid, pack_grid
+
+    for size in range(MIN_SIZE, MAX_SIZE + 1, 2):
+        boards = list(_random_boards(count, seed, size))
+        grids = [pack_grid(values) for values in boards]
+        start = time.perf_counter()
+        for values in boards:
+            for direction in DIRECTIONS:
+                _reference_move(values, direction)
+        reference = time.perf_counter() - start
+        start = time.perf_counter()
+        for grid in grids:
+            for direction in DIRECTIONS:
+                move_grid(grid, direction)
+        vectorized = time.perf_counter() - start
+        moves = count * len(DIRECTIONS)
+        print(f"Доска {size:2d}x{size:<2d}: списки {reference / moves * 1e6:7.1f} мкс, "
+              f"NumPy {vectorized / moves * 1e6:6.1f} мкс")
+
+def _random_run(game, rng, moves):
+    # Случайная партия с запоминанием всех позиций (для сверки отмен)
+    positions = [game.snapshot()]
+    while not game.game_over and len(positions) <= moves:
+        game.play(rng.choice(game.legal_moves()))
+        positions.append(game.snapshot())
+    return positions
+
+def _same_position(a, b):
+    return (a[0] == b[0]).all() and a[1] == b[1] if hasattr(a[0], 'shape') else a == b
+
+def check_history(games=30, seed=9, grid_size=6):
+    # Отмена до начала партии, запись в файл и повтор должны давать
+    # ровно те позиции, что были сыграны
+    factories = [lambda rng: Game6561(rng)]
+    try:
+        from game6561_grid import GridGame6561
+        factories.append(lambda rng: GridGame6561(grid_size, rng))
+    except ImportError:
+        pass
+    path = os.path.join(tempfile.mkdtemp(), "run.bin")
+    checked = 0
+    for make_game in factories:
+        for game_seed in range(games):
+            rng = random.Random(seed + game_seed)
+            game = make_game(rng)
+            positions = _random_run(game, rng, 400)
+            game.save_history(path)
+            loaded = make_game(random.Random())
+            loaded.load_history(path)
+            if not _same_position(loaded.snapshot(), positions[-1]) or loaded.game_over != game.game_over:
+                raise AssertionError("загруженная партия разошлась с сыгранной")
+            replayed = make_game(random.Random())
+            replayed.restore(game.history.start)
+            for i, position in enumerate(game.history.replay(replayed), 1):
+                if not _same_position(position.snapshot(), positions[i]):
+                    raise AssertionError(f"повтор разошёлся на ходу {i}")
+            # отмены подряд, затем новые ходы и снова отмены
+            for i in range(len(positions) - 2, len(positions) // 2, -1):
+                game.undo()
+                if not _same_position(game.snapshot(), positions[i]):
+                    raise AssertionError(f"отмена до хода {i} дала другую позицию")
+            branch = _random_run(game, rng, 100)
+            for i in range(len(branch) - 2, -1, -1):
+                game.undo()
+                if not _same_position(game.snapshot(), branch[i]):
+                    raise AssertionError("отмена после новых ходов дала другую позицию")
+            while game.undo():
+                pass
+            if not _same_position(game.snapshot(), positions[0]) or len(game.history):
+                raise AssertionError("отмена до начала не вернула начальную позицию")
+            checked += 1
+    return checked
+
+def check_corrupt_history(seed=12):
+    # Испорченная запись (плитка вне доски, неверная степень, слишком большая
+    # степень на начальной доске) не загружается и не меняет текущую партию
+    path = os.path.join(tempfile.mkdtemp(), "run.bin")
+    rng = random.Random(seed)
+    game = Game6561(rng)
+    _random_run(game, rng, 30)
+    game.save_history(path)
+    with open(path, "rb") as f:
+        data = f.read()
+    header = 4 + struct.calcsize("<BQI")
+    first_move = header + BOARD_SIZE * BOARD_SIZE
+    broken = []
+    for code in (40 << 4 | 1 << 2, 3 << 2):
+        damaged = bytearray(data)
+        struct.pack_into("<H", damaged, first_move, code)
+        broken.append(damaged)
+    damaged = bytearray(data)
+    damaged[header] = 200
+    broken.append(damaged)
+    before = game.snapshot(), len(game.history)
+    for damaged in broken:
+        with open(path, "wb") as f:
+            f.write(damaged)
+        try:
+            game.load_history(path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("испорченная запись загрузилась")
+        if (game.snapshot(), len(game.history)) != before:
+            raise AssertionError("испорченная запись изменила партию")
+    return len(broken)
+
+def bench_history(games=100, seed=10):
+    # Цена записи хода, повтор партии и отмена, байт на ход в файле
+    rng = random.Random(seed)
+    runs = []
+    for _ in range(games):
+        game = Game6561(rng)
+        while not game.game_over:
+            game.play(rng.choice(game.legal_moves()))
+        runs.append(game)
+    moves = sum(len(game.history) for game in runs)
+    start = time.perf_counter()
+    for game in runs:
+        replayed = Game6561(rng)
+        replayed.restore(game.history.start)
+        for _ in game.history.replay(replayed):
+            pass
+    replay = time.perf_counter() - start
+    path = os.path.join(tempfile.mkdtemp(), "run.bin")
+    runs[0].save_history(path)
+    saved_moves = len(runs[0].history)
+    start = time.perf_counter()
+    for game in runs:
+        while game.undo():
+            pass
+    undo = time.perf_counter() - start
+    print(f"История: повтор {moves / replay:.0f} ходов/с, отмена {undo / moves * 1e6:.1f} мкс, "
+          f"файл {os.path.getsize(path)} байт на {saved_moves} ходов")
+
+def _board_from_movements(movements, size):
+    # Доска после хода, собранная из путей плиток: слитые пары дают степень + 1
+    values = [[0] * size for _ in range(size)]
+    for _, _, row, col, exponent, merged in movements:
+        if merged and values[row][col]:
+            values[row][col] = 3 ** (exponent + 1)
+        else:
+            values[row][col] = 3 ** exponent
+    return values
+
+def check_movements(count=5000, seed=11, grid_size=7):
+    # Пути плиток должны приводить ровно к доске после хода
+    for values in _random_boards(count, seed):
+        board = pack(values)
+        for direction in DIRECTIONS:
+            movements = tile_movements(lambda r, c: get_exponent(board, r, c), BOARD_SIZE, direction)
+            if _board_from_movements(movements, BOARD_SIZE) != unpack(move(board, direction)[0]):
+                raise AssertionError(f"пути плиток хода {direction} не дают доску после хода: {values}")
+    for values in _random_boards(count // 10, seed, grid_size):
+        for direction in DIRECTIONS:
+            movements = tile_movements(lambda r, c: exponent_of(values[r][c]), grid_size, direction, None)
+            if _board_from_movements(movements, grid_size) != _reference_move(values, direction)[0]:
+                raise AssertionError(f"пути плиток на доске {grid_size}x{grid_size} разошлись с эталоном")
+    return count + count // 10
+
+if __name__ == "__main__":
+    print(f"Проверено досок: {check_move_equivalence()}")
+    bench_moves()
+    print("Проверено досок и партий с масками клеток: {} и {}".format(*check_incremental_equivalence()))
+    bench_random_games()
+    print(f"Проверено партий с отменой и повтором: {check_history()}")
+    print(f"Отклонено испорченных записей: {check_corrupt_history()}")
+    print(f"Проверено досок с путями плиток: {check_movements()}")
+    bench_history()
+    bench_monte_carlo()
+    print(f"Повторено ходов Монте-Карло: {check_monte_carlo_repeatable()}")
+    try:
+        import numpy
+    except ImportError:
+        print("NumPy не установлен - пакетный симулятор пропущен")
+    else:
+        print(f"Проверено досок пакетом: {check_batch_equivalence()}")
+        bench_batch()
+        print(f"Проверено досок NxN: {check_grid_equivalence()}")
+        bench_grid_sizes()
@@ -0,0 +1,162 @@
+import random
+
+import numpy as np
+
+from game6561 import LEFT, RIGHT, UP, SPAWN_THREE_CHANCE, Game6561
+
+# ---------------------------------------------------------
+# Доска 6561 произвольного размера NxN (до 16x16) на NumPy
+# ---------------------------------------------------------
+# Упакованная доска из game6561.py с таблицами строк годится только
+# для 4x4 (строка 5x5 - уже 2 ** 20 вариантов). Здесь доска - массив
+# степеней тройки (0 - пусто), и ход сдвигает все строки сразу
+# векторными операциями: сжатие, поиск пар для слияния, второе сжатие.
+# Вертикальные ходы и ход вправо - те же строки через виды массива
+# (транспонирование и разворот), без копирования.
+# У каждой операции NumPy постоянная цена вызова, поэтому на малых досках
+# векторный ход медленнее прежних списков (по bench_grid_sizes в
+# game6561_bench.py - примерно до 10x10) и выигрывает с 12x12. Доску 4x4
+# окно и так ведёт на упакованном Game6561; для 5x5..10x10 ход всё равно
+# укладывается в десятки микросекунд, а доска остаётся одним массивом.
+MIN_SIZE = 4
+MAX_SIZE = 16
+GRID_MAX_EXPONENT = 255   # клетка - uint8; такие плитки уже не сливаются (как MAX_EXPONENT)
+
+def _compress(rows):
+    # Плитки к началу строк с сохранением порядка, пустые - в конец
+    order = np.argsort(rows == 0, axis=1, kind='stable')
+    return np.take_along_axis(rows, order, axis=1)
+
+def slide_rows_left(rows):
+    # Все строки влево по правилам _slide_left: равные соседи сливаются
+    # слева направо, в серии одинаковых плиток - пары (0, 1), (2, 3), ...
+    # Плитки GRID_MAX_EXPONENT не сливаются: их степень не поместилась бы
+    # в uint8. Возвращает (строки, очки, число слияний)
+    rows = _compress(rows)
+    columns = np.arange(rows.shape[1])
+    equal = (rows[:, 1:] == rows[:, :-1]) & (rows[:, :-1] != 0) & (rows[:, :-1] != GRID_MAX_EXPONENT)
+    starts = np.ones(rows.shape, dtype=bool)
+    starts[:, 1:] = ~equal
+    run_start = np.maximum.accumulate(np.where(starts, columns, 0), axis=1)
+    heads = np.zeros(rows.shape, dtype=bool)
+    heads[:, :-1] = equal & ((columns[:-1] - run_start[:, :-1]) % 2 == 0)
+    # очки - обычные числа Python: 3 ** e быстро выходит за int64
+    merged = rows[heads].tolist()
+    score = sum(3 ** (e + 1) for e in merged)
+    rows = rows + heads
+    rows[:, 1:][heads[:, :-1]] = 0
+    return _compress(rows), score, len(merged)
+
+def _oriented(grid, direction):
+    # Вид доски, в котором ход direction - это ход влево по строкам
+    if direction == LEFT:
+        return grid
+    if direction == RIGHT:
+        return grid[:, ::-1]
+    if direction == UP:
+        return grid.T
+    return grid.T[:, ::-1]
+
+def move_grid(grid, direction):
+    # (новая доска, очки, число слияний); как move в game6561, но для массива NxN
+    rows, score, merges = slide_rows_left(_oriented(grid, direction))
+    result = np.empty_like(grid)
+    _oriented(result, direction)[...] = rows
+    return result, score, merges
+
+def grid_has_merge(grid):
+    # Есть ли соседние равные плитки по горизонтали или вертикали
+    return bool((((grid[:, 1:] == grid[:, :-1]) & (grid[:, 1:] != 0)).any()
+                 or ((grid[1:] == grid[:-1]) & (grid[1:] != 0)).any()))
+
+def pack_grid(values):
+    # Массив степеней из списка строк с обычными значениями (0, 3, 9, ...)
+    grid = np.zeros((len(values), len(values)), dtype=np.uint8)
+    for row, line in enumerate(values):
+        for col, value in enumerate(line):
+            while value > 1:
+                value //= 3
+                grid[row, col] += 1
+    return grid
+
+# ---------------------------------------------------------
+# Игра без окна на доске NxN: правила, история и отмена - из Game6561,
+# здесь только действия с массивом. Число пустых клеток не пересчитывается
+# по доске: ход добавляет по клетке на слияние, плитка забирает одну.
+# Слияния (has_merge) нужны только для конца игры, поэтому ищутся лишь на
+# заполненной доске, иначе has_merge - None. Саму пустую клетку для новой
+# плитки spawn находит одним векторным проходом по доске - как и ход, он
+# всё равно переставляет все клетки, так что список пустых не хранится.
+# ---------------------------------------------------------
+class GridGame6561(Game6561):
+    merge_limit = GRID_MAX_EXPONENT
+    cell_limit = GRID_MAX_EXPONENT
+
+    def __init__(self, size, rng=random):
+        if not MIN_SIZE <= size <= MAX_SIZE:
+            raise ValueError(f"размер доски должен быть от {MIN_SIZE} до {MAX_SIZE}")
+        self.size = size
+        super().__init__(rng)
+
+    def _empty_board(self):
+        return np.zeros((self.size, self.size), dtype=np.uint8)
+
+    def _update_empty(self, merges=None):
+        if merges is None:
+            self.empty_count = int(np.count_nonzero(self.board == 0))
+        else:
+            self.empty_count += merges
+
+    def _update_merge(self):
+        self.has_merge = None if self.empty_count else grid_has_merge(self.board)
+
+    def _update_cells(self):
+        self._update_empty()
+        self._update_merge()
+
+    def _move_board(self, direction):
+        new_board, score, merges = move_grid(self.board, direction)
+        return new_board, score, not np.array_equal(new_board, self.board), merges
+
+    def _best_exponent(self):
+        return int(self.board.max())
+
+    def _exponent_at(self, row, col):
+        return int(self.board[row, col])
+
+    def spawn(self):
+        # Как Game6561.spawn: пустая клетка в порядке обхода строк, 3 или 9
+        if not self.empty_count:
+            return None
+        cell = int(np.flatnonzero(self.board == 0)[self.rng.choice(range(self.empty_count))])
+        row, col = divmod(cell, self.size)
+        exponent = 1 if self.rng.random() < SPAWN_THREE_CHANCE else 2
+        self.place(row, col, exponent)
+        return row, col, exponent
+
+    def place(self, row, col, exponent):
+        if not self.board[row, col]:
+            self.empty_count -= 1
+        self.board[row, col] = exponent
+        self._update_merge()
+
+    def values(self):
+        return [[3 ** e if e else 0 for e in row] for row in self.board.tolist()]
+
+    def snapshot(self):
+        return self.board.copy(), self.score
+
+    def restore(self, snapshot):
+        board, score = snapshot
+        super().restore((board.copy(), score))
+
+    def _board_cells(self, board):
+        return board.tobytes()
+
+    def _board_from_cells(self, cells):
+        return np.frombuffer(cells, dtype=np.uint8).reshape(self.size, self.size).copy()
+
+    def copy(self):
+        new = super().copy()
+        new.board = self.board.copy()
+        return new